@@ -1,11 +1,15 @@
 from flask import Flask, redirect, url_for
-from .extensions import db, migrate, login_manager
+from .extensions import db, migrate, login_manager, configure_sqlite
+from . import sharding, commit_queue, passwords, serve
 from .config import Config
+from .commands import register_commands
 
 from .blueprints.auth.routes import auth_bp
 from .blueprints.dashboard.routes import dashboard_bp
 from .blueprints.expenses.routes import expenses_bp
 from .blueprints.reports.routes import reports_bp
+from .blueprints.recurring.routes import recurring_bp
+from .blueprints.account.routes import account_bp
 
 
 def create_app():
@@ -16,9 +20,12 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    passwords.init_app(app)
 
     # Ensure tables exist for a smooth first run
     with app.app_context():
+        for engine in db.engines.values():
+            configure_sqlite(engine, app.config.get("SQLITE_JOURNAL_MODE"))
         db.create_all()
         # Seed global categories (shared across all accounts) if not present
         try:
@@ -42,11 +49,18 @@ def create_app():
             # Do not block app startup if seeding fails
             db.session.rollback()
 
+    sharding.init_app(app)
+    commit_queue.init_app(app)
+    serve.init_app(app)
+
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(expenses_bp)
     app.register_blueprint(reports_bp)
+    app.register_blueprint(recurring_bp)
+    app.register_blueprint(account_bp)
+    register_commands(app)
 
     @app.route("/")
     def root():
@@ -0,0 +1,29 @@
+"""Fire-and-forget jobs on a thread of the current process.
+
+Jobs get their own app context and session and must be safe to re-run: a
+restart of the process simply drops whatever was in flight, and the matching
+CLI command can finish the work.
+"""
+import threading
+
+from flask import current_app
+
+from .extensions import db
+
+
+def spawn(fn, *args, name=None):
+    """Run ``fn(*args)`` in a daemon thread and return the thread."""
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                fn(*args)
+            except Exception:
+                app.logger.exception("background job %s failed", name or fn.__name__)
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=run, name=name or fn.__name__, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,52 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, abort
+from flask_login import login_required, current_user, logout_user
+from ...background import spawn
+from ...passwords import HashingBusy
+from ...services.account import export_account, purge_account, list_exports, export_in_progress
+
+account_bp = Blueprint("account", __name__, url_prefix="/account")
+
+
+@account_bp.route("/")
+@login_required
+def index():
+    return render_template("account/index.html", exports=list_exports(current_user.id),
+                           exporting=export_in_progress(current_user.id))
+
+
+@account_bp.route("/export", methods=["POST"])
+@login_required
+def start_export():
+    if export_in_progress(current_user.id):
+        flash("An export is already being prepared", "info")
+    else:
+        spawn(export_account, current_user.id, name=f"export-{current_user.id}")
+        flash("Export started. Refresh this page in a moment to download it.", "success")
+    return redirect(url_for("account.index"))
+
+
+@account_bp.route("/exports/<name>")
+@login_required
+def download_export(name):
+    for path in list_exports(current_user.id):
+        if path.name == name:
+            return send_file(path, mimetype="application/zip", as_attachment=True, download_name=name)
+    abort(404)
+
+
+@account_bp.route("/delete", methods=["POST"])
+@login_required
+def delete_account():
+    try:
+        ok = current_user.check_password(request.form.get("password") or "")
+    except HashingBusy:
+        flash("The server is busy, please try again in a moment", "warning")
+        return redirect(url_for("account.index"))
+    if not ok:
+        flash("Password is incorrect", "danger")
+        return redirect(url_for("account.index"))
+    user_id = current_user.id
+    logout_user()
+    spawn(purge_account, user_id, name=f"purge-{user_id}")
+    flash("Your account is being deleted", "info")
+    return redirect(url_for("auth.login"))
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from ...extensions import db
 from ...models import User
+from ...passwords import HashingBusy
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -19,7 +20,11 @@ def register():
             flash("Email already registered", "warning")
             return render_template("auth/register.html")
         user = User(name=name, email=email)
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except HashingBusy:
+            flash("The server is busy, please try again in a moment", "warning")
+            return render_template("auth/register.html"), 503
         db.session.add(user)
         db.session.commit()
         flash("Registration successful. Please log in.", "success")
@@ -33,7 +38,19 @@ def login():
         email = request.form.get("email")
         password = request.form.get("password")
         user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
+        try:
+            ok = user is not None and user.check_password(password)
+        except HashingBusy:
+            flash("The server is busy, please try again in a moment", "warning")
+            return render_template("auth/login.html"), 503
+        if ok:
+            if user.password_needs_rehash():
+                # Hash settings changed since this password was stored
+                try:
+                    user.set_password(password)
+                    db.session.commit()
+                except HashingBusy:
+                    pass  # upgraded on a later login
             login_user(user)
             flash("Logged in successfully", "success")
             return redirect(url_for("dashboard.index"))
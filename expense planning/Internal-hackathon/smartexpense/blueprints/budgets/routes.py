@@ -1,8 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from sqlalchemy import func
 from ...extensions import db
-from ...models import Budget, BudgetCategory, Expense, Category
+from ...models import Budget, BudgetCategory, Category
+from ...services.budgets import category_states, month_states
 
 budgets_bp = Blueprint("budgets", __name__, url_prefix="/budgets")
 
@@ -23,7 +23,11 @@ def manage_budgets():
         return redirect(url_for("budgets.manage_budgets"))
 
     budgets = Budget.query.filter_by(user_id=current_user.id).order_by(Budget.month.desc()).all()
-    return render_template("budgets/list.html", budgets=budgets)
+    # Spent per month comes from the budget engine, like every other view
+    states = month_states(current_user.id, {b.month for b in budgets})
+    spent = {month: float(s.spent) for month, s in states.items()}
+    db.session.commit()  # keep budget states built on first use
+    return render_template("budgets/list.html", budgets=budgets, spent=spent)
 
 
 @budgets_bp.route("/categories", methods=["GET", "POST"])
@@ -50,29 +54,19 @@ def category_budgets():
     # Fetch all expense-type categories
     categories = Category.query.filter_by(user_id=current_user.id, type="expense").order_by(Category.name).all()
 
-    # Existing budgets for month
-    bc_rows = BudgetCategory.query.filter_by(user_id=current_user.id, month=month).all()
-    bc_map = {row.category_id: row for row in bc_rows}
-
-    # Compute spent per category for month
-    month_spend = dict(
-        db.session.query(Expense.category_id, func.coalesce(func.sum(Expense.amount), 0.0))
-        .filter(
-            Expense.user_id == current_user.id,
-            func.strftime('%Y-%m', Expense.spent_on) == month
-        )
-        .group_by(Expense.category_id)
-        .all()
-    )
+    # Spent, limit and status per category, precomputed by the budget engine
+    states = category_states(current_user.id, month)
 
     # Build view model list
     view = []
     for c in categories:
-        limit = bc_map.get(c.id).limit_amount if bc_map.get(c.id) else None
-        spent = float(month_spend.get(c.id, 0.0))
-        status = "none"
-        if limit is not None:
-            status = "over" if spent > limit else ("near" if spent >= 0.9 * limit else "ok")
-        view.append({"category": c, "limit": limit, "spent": spent, "status": status})
+        state = states.get(c.id)
+        view.append({
+            "category": c,
+            "limit": state.limit_amount if state else None,
+            "spent": float(state.spent) if state else 0.0,
+            "status": state.status if state else "none",
+        })
+    db.session.commit()  # keep budget states built on first use
 
     return render_template("budgets/categories.html", month=month, categories=categories, rows=view)
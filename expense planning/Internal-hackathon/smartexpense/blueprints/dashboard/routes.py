@@ -1,9 +1,10 @@
 from datetime import date
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
-from sqlalchemy import func
 from ...extensions import db
 from ...models import Expense, Category, Budget
+from ...commit_queue import run_write
+from ...services.budgets import month_state, category_states, unseen_alerts, mark_alerts_seen
 
 
 dashboard_bp = Blueprint("dashboard", __name__, url_prefix="/dashboard")
@@ -14,19 +15,14 @@ dashboard_bp = Blueprint("dashboard", __name__, url_prefix="/dashboard")
 def index():
     today = date.today()
     month_prefix = today.strftime("%Y-%m")
-    # Monthly totals
-    q_base = db.session.query(func.coalesce(func.sum(Expense.amount), 0.0)).filter(
-        Expense.user_id == current_user.id,
-        func.strftime('%Y-%m', Expense.spent_on) == month_prefix
-    )
-    total_expense = q_base.join(Category, Expense.category_id == Category.id).filter(Category.type == 'expense').scalar()
-    total_income = q_base.join(Category, Expense.category_id == Category.id).filter(Category.type == 'income').scalar()
-    total_savings = q_base.join(Category, Expense.category_id == Category.id).filter(Category.type == 'savings').scalar()
+    # Monthly totals and budget status come precomputed from the budget engine
+    month = month_state(current_user.id, month_prefix)
+    total_expense, total_income, total_savings = month.spent, month.income, month.savings
     balance = (total_income or 0.0) - (total_expense or 0.0) - (total_savings or 0.0)
 
-    by_category = db.session.query(Category.name, func.sum(Expense.amount)).join(Expense).\
-        filter(Expense.user_id == current_user.id, func.strftime('%Y-%m', Expense.spent_on) == month_prefix, Category.type=='expense').\
-        group_by(Category.name).all()
+    spent_by_category = {cid: s.spent for cid, s in category_states(current_user.id, month_prefix).items() if s.spent}
+    names = dict(db.session.query(Category.id, Category.name).filter(Category.id.in_(spent_by_category)).all())
+    by_category = [(names.get(cid, "Other"), spent) for cid, spent in spent_by_category.items()]
 
     labels = [row[0] for row in by_category]
     data = [float(row[1]) for row in by_category]
@@ -36,10 +32,16 @@ def index():
 
 
     # Monthly budget alert
-    b = Budget.query.filter_by(user_id=current_user.id, month=month_prefix).first()
-    budget_limit = b.limit_amount if b else None
-    over_budget = bool(budget_limit and total_expense > budget_limit)
-    nearing_budget = bool(budget_limit and not over_budget and total_expense >= 0.9 * budget_limit)
+    budget_limit = month.limit_amount
+    over_budget = month.status == "over"
+    nearing_budget = month.status == "near"
+
+    # Commit before loading alerts, which would otherwise expire and be
+    # re-read one by one while the template renders
+    db.session.commit()  # keep budget states built on first use
+    alerts = unseen_alerts(current_user.id)
+    alert_names = dict(db.session.query(Category.id, Category.name)
+                       .filter(Category.id.in_({a.category_id for a in alerts})).all())
 
     return render_template(
         "dashboard/index.html",
@@ -54,9 +56,20 @@ def index():
         budget_limit=budget_limit,
         over_budget=over_budget,
         nearing_budget=nearing_budget,
+        alerts=alerts,
+        alert_names=alert_names,
     )
 
 
+@dashboard_bp.route("/alerts/dismiss", methods=["POST"])
+@login_required
+def dismiss_alerts():
+    # Only the alerts the user was shown; older ones appear next
+    mark_alerts_seen(current_user.id, request.form.getlist("alert_id", type=int))
+    db.session.commit()
+    return redirect(url_for("dashboard.index"))
+
+
 @dashboard_bp.route("/seed")
 @login_required
 def seed_demo():
@@ -126,16 +139,25 @@ def add_income():
 
     spent_on = _date.fromisoformat(date_str) if date_str else _date.today()
     amount = float(amount_raw)
-    # Use or create a default income category
-    cat = Category.query.filter_by(user_id=current_user.id, type='income').order_by(Category.id).first()
-    if not cat:
-        cat = Category(user_id=current_user.id, name='Income', type='income')
-        db.session.add(cat)
-        db.session.flush()  # get cat.id without full commit
-
-    db.session.add(Expense(user_id=current_user.id, title=title, category_id=cat.id, amount=amount,
-                           payment_mode=payment_mode, spent_on=spent_on, note=note))
-    db.session.commit()
+    user_id = current_user.id
+
+    def save_income():
+        # Use or create a default income category
+        cat = Category.query.filter_by(user_id=user_id, type='income').order_by(Category.id).first()
+        if not cat:
+            cat = Category(user_id=user_id, name='Income', type='income')
+            db.session.add(cat)
+            db.session.flush()  # get cat.id without full commit
+
+        db.session.add(Expense(user_id=user_id, title=title, category_id=cat.id, amount=amount,
+                               payment_mode=payment_mode, spent_on=spent_on, note=note))
+
+    try:
+        run_write(save_income, user_id)
+    except Exception:
+        current_app.logger.exception("saving income failed")
+        flash('An error occurred while saving income; nothing was added', 'danger')
+        return redirect(url_for('dashboard.index'))
     flash('Income added', 'success')
     return redirect(url_for('dashboard.index'))
 
@@ -156,16 +178,24 @@ def add_savings():
 
     spent_on = _date.fromisoformat(date_str) if date_str else _date.today()
     amount = float(amount_raw)
-
-    # Use or create a default savings category
-    cat = Category.query.filter_by(user_id=current_user.id, type='savings').order_by(Category.id).first()
-    if not cat:
-        cat = Category(user_id=current_user.id, name='Savings', type='savings')
-        db.session.add(cat)
-        db.session.flush()
-
-    db.session.add(Expense(user_id=current_user.id, title=title, category_id=cat.id, amount=amount,
-                           payment_mode=payment_mode, spent_on=spent_on, note=note))
-    db.session.commit()
+    user_id = current_user.id
+
+    def save_savings():
+        # Use or create a default savings category
+        cat = Category.query.filter_by(user_id=user_id, type='savings').order_by(Category.id).first()
+        if not cat:
+            cat = Category(user_id=user_id, name='Savings', type='savings')
+            db.session.add(cat)
+            db.session.flush()
+
+        db.session.add(Expense(user_id=user_id, title=title, category_id=cat.id, amount=amount,
+                               payment_mode=payment_mode, spent_on=spent_on, note=note))
+
+    try:
+        run_write(save_savings, user_id)
+    except Exception:
+        current_app.logger.exception("saving savings failed")
+        flash('An error occurred while saving savings; nothing was added', 'danger')
+        return redirect(url_for('dashboard.index'))
     flash('Savings added', 'success')
     return redirect(url_for('dashboard.index'))
@@ -1,9 +1,13 @@
 from datetime import date, datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from ...extensions import db
-from ...models import Expense, Category, Budget, BudgetCategory
-from sqlalchemy import or_, and_, func
+from ...models import Expense, Category
+from ...services.history import expense_rows, category_in_use
+from ...services.budgets import check_expense
+from ...services.recurring import category_has_rules
+from ...commit_queue import run_write
+from sqlalchemy import or_, and_
 
 
 expenses_bp = Blueprint("expenses", __name__, url_prefix="/expenses")
@@ -12,84 +16,11 @@ expenses_bp = Blueprint("expenses", __name__, url_prefix="/expenses")
 @expenses_bp.route("/")
 @login_required
 def list_expenses():
-    expenses = Expense.query.filter_by(user_id=current_user.id).order_by(Expense.spent_on.desc()).all()
+    # Full history, including months moved to the archive tables
+    expenses = db.session.execute(expense_rows(current_user.id)).all()
     return render_template("expenses/list.html", expenses=expenses)
 
 
-def check_budget_exceeded(user_id, amount, category_id=None, date_obj=None):
-    """Check if adding this expense would exceed any budget limits."""
-    if not date_obj:
-        date_obj = date.today()
-    
-    month_str = date_obj.strftime("%Y-%m")
-    
-    # First, check against remaining monthly balance (income - expenses - savings)
-    # Compute totals for the month
-    total_income = db.session.query(
-        func.coalesce(func.sum(Expense.amount), 0)
-    ).join(Category, Expense.category_id == Category.id).filter(
-        Expense.user_id == user_id,
-        func.strftime("%Y-%m", Expense.spent_on) == month_str,
-        Category.type == 'income'
-    ).scalar() or 0
-    total_expense = db.session.query(
-        func.coalesce(func.sum(Expense.amount), 0)
-    ).join(Category, Expense.category_id == Category.id).filter(
-        Expense.user_id == user_id,
-        func.strftime("%Y-%m", Expense.spent_on) == month_str,
-        Category.type == 'expense'
-    ).scalar() or 0
-    total_savings = db.session.query(
-        func.coalesce(func.sum(Expense.amount), 0)
-    ).join(Category, Expense.category_id == Category.id).filter(
-        Expense.user_id == user_id,
-        func.strftime("%Y-%m", Expense.spent_on) == month_str,
-        Category.type == 'savings'
-    ).scalar() or 0
-    remaining_balance = (total_income or 0) - (total_expense or 0) - (total_savings or 0)
-    
-    if amount > remaining_balance:
-        return f"Amount exceeds available balance. Remaining: ₹{remaining_balance:.2f}"
-    
-    # Check category budget first (if category is provided)
-    if category_id:
-        category_budget = BudgetCategory.query.filter(
-            BudgetCategory.user_id == user_id,
-            BudgetCategory.category_id == category_id,
-            BudgetCategory.month == month_str
-        ).first()
-        
-        if category_budget:
-            total_spent = db.session.query(
-                func.coalesce(func.sum(Expense.amount), 0)
-            ).filter(
-                Expense.user_id == user_id,
-                Expense.category_id == category_id,
-                func.strftime("%Y-%m", Expense.spent_on) == month_str
-            ).scalar() or 0
-            
-            if total_spent + amount > category_budget.limit_amount:
-                return f"Adding this expense would exceed your budget for this category. Remaining: ₹{category_budget.limit_amount - total_spent:.2f}"
-    
-    # Check overall monthly budget
-    monthly_budget = Budget.query.filter_by(
-        user_id=user_id,
-        month=month_str
-    ).first()
-    
-    if monthly_budget:
-        total_monthly_spent = db.session.query(
-            func.coalesce(func.sum(Expense.amount), 0)
-        ).filter(
-            Expense.user_id == user_id,
-            func.strftime("%Y-%m", Expense.spent_on) == month_str
-        ).scalar() or 0
-        
-        if total_monthly_spent + amount > monthly_budget.limit_amount:
-            return f"Adding this expense would exceed your monthly budget. Remaining: ₹{monthly_budget.limit_amount - total_monthly_spent:.2f}"
-    
-    return None
-
 @expenses_bp.route("/create", methods=["GET", "POST"])
 @login_required
 def create_expense():
@@ -101,8 +32,8 @@ def create_expense():
     )
     
     if request.method == "POST":
-        created = 0
         errors = []
+        entries = []
         
         for i in (1, 2, 3):
             title = request.form.get(f"title_{i}")
@@ -112,6 +43,12 @@ def create_expense():
             # Skip empty expense entries
             if not title or not amount_raw or not category_id:
                 continue
+
+            try:
+                category_id = int(category_id)
+            except ValueError:
+                errors.append(f"Expense {i}: Invalid category")
+                continue
                 
             try:
                 amount = float(amount_raw)
@@ -119,41 +56,58 @@ def create_expense():
                     errors.append(f"Expense {i}: Amount must be greater than zero")
                     continue
                     
-                # Check budget before adding
                 spent_on_str = request.form.get(f"spent_on_{i}")
                 spent_on = date.fromisoformat(spent_on_str) if spent_on_str else date.today()
                 
-                budget_check = check_budget_exceeded(
-                    current_user.id, 
-                    amount, 
-                    category_id,
-                    spent_on
+                entries.append(dict(
+                    title=title,
+                    category_id=category_id,
+                    amount=amount,
+                    payment_mode=request.form.get(f"payment_mode_{i}"),
+                    spent_on=spent_on,
+                    note=request.form.get(f"note_{i}"),
+                ))
+                
+            except ValueError:
+                errors.append(f"Expense {i}: Invalid amount")
+                continue
+        
+        user_id = current_user.id
+        
+        def save_entries():
+            # Runs in the request or in the group-commit writer: budget checks
+            # see rows added earlier in the same batch through autoflush.
+            created, budget_errors = 0, []
+            for entry in entries:
+                budget_check = check_expense(
+                    user_id, 
+                    entry["amount"], 
+                    entry["category_id"],
+                    entry["spent_on"]
                 )
                 
                 if budget_check:
-                    errors.append(f"Expense '{title}': {budget_check}")
+                    budget_errors.append(f"Expense '{entry['title']}': {budget_check}")
                     continue
                 
-                # If budget check passed, create the expense
-                payment_mode = request.form.get(f"payment_mode_{i}")
-                note = request.form.get(f"note_{i}")
-                
-                exp = Expense(
-                    user_id=current_user.id, 
-                    title=title, 
-                    category_id=category_id, 
-                    amount=amount,
-                    payment_mode=payment_mode, 
-                    spent_on=spent_on, 
-                    note=note
-                )
-                
-                db.session.add(exp)
+                db.session.add(Expense(user_id=user_id, **entry))
                 created += 1
-                
-            except ValueError:
-                errors.append(f"Expense {i}: Invalid amount")
-                continue
+            return created, budget_errors
+        
+        created = 0
+        if entries:
+            try:
+                created, budget_errors = run_write(save_entries, user_id)
+                errors.extend(budget_errors)
+            except Exception as e:
+                # Answer with an error status (503 for lock contention) so
+                # clients and the load test can tell a failed write apart
+                current_app.logger.exception("saving expenses failed")
+                if "database is locked" in str(e):
+                    flash("The database is busy (database is locked); no expenses were saved, please try again", "danger")
+                    return render_template("expenses/form.html", categories=categories), 503
+                flash("An error occurred while saving expenses; none were saved", "danger")
+                return render_template("expenses/form.html", categories=categories), 500
         
         if errors:
             for error in errors:
@@ -164,14 +118,9 @@ def create_expense():
                 return render_template("expenses/form.html", categories=categories)
         
         if created > 0:
-            try:
-                db.session.commit()
-                flash(f"{created} expense(s) added successfully", "success")
-                if errors:
-                    flash("Some expenses were not added due to budget limits", "warning")
-            except Exception as e:
-                db.session.rollback()
-                flash("An error occurred while saving expenses", "danger")
+            flash(f"{created} expense(s) added successfully", "success")
+            if errors:
+                flash("Some expenses were not added due to budget limits", "warning")
         elif not errors:
             flash("No expenses provided", "warning")
             
@@ -197,12 +146,18 @@ def check_budget_api():
     except (TypeError, ValueError):
         return jsonify({"ok": False, "message": "Invalid amount"}), 400
 
+    try:
+        category_id = int(category_id)
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "message": "Invalid category_id"}), 400
+
     try:
         date_obj = date.fromisoformat(spent_on_str) if spent_on_str else date.today()
     except Exception:
         date_obj = date.today()
 
-    msg = check_budget_exceeded(current_user.id, amount, category_id, date_obj)
+    msg = check_expense(current_user.id, amount, category_id, date_obj)
+    db.session.commit()  # keep budget states built on first use
     if msg:
         return jsonify({"ok": False, "message": msg}), 200
     return jsonify({"ok": True, "message": "Within budget"}), 200
@@ -214,8 +169,13 @@ def edit_expense(expense_id):
     exp = Expense.query.filter_by(id=expense_id, user_id=current_user.id).first_or_404()
     categories = Category.query.filter_by(user_id=current_user.id, type="expense").order_by(Category.name).all()
     if request.method == "POST":
+        try:
+            category_id = int(request.form.get("category_id"))
+        except (TypeError, ValueError):
+            flash("Invalid category", "danger")
+            return render_template("expenses/form.html", expense=exp, categories=categories), 400
         exp.title = request.form.get("title")
-        exp.category_id = request.form.get("category_id")
+        exp.category_id = category_id
         exp.amount = float(request.form.get("amount"))
         exp.payment_mode = request.form.get("payment_mode")
         spent_on_str = request.form.get("spent_on")
@@ -323,10 +283,13 @@ def edit_category(category_id):
 def delete_category(category_id):
     cat = Category.query.filter_by(id=category_id, user_id=current_user.id).first_or_404()
     # Prevent deletion if referenced by any expenses
-    used = Expense.query.filter_by(user_id=current_user.id, category_id=cat.id).first()
-    if used:
+    if category_in_use(current_user.id, cat.id):
         flash("Cannot delete category in use by expenses", "danger")
         return redirect(url_for("expenses.manage_categories"))
+    # Rules would keep posting rows to the deleted category
+    if category_has_rules(current_user.id, cat.id):
+        flash("Cannot delete category used by recurring rules", "danger")
+        return redirect(url_for("expenses.manage_categories"))
     db.session.delete(cat)
     db.session.commit()
     flash("Category deleted", "info")
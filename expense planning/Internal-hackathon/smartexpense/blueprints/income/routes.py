@@ -3,6 +3,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from ...extensions import db
 from ...models import Expense, Category
+from ...commit_queue import run_write
 
 income_bp = Blueprint("income", __name__, url_prefix="/income")
 
@@ -44,8 +45,7 @@ def create_income():
             spent_on=on_date,
             note=note,
         )
-        db.session.add(row)
-        db.session.commit()
+        run_write(lambda: db.session.add(row), current_user.id)
         flash("Income added", "success")
         return redirect(url_for("income.list_income"))
     return render_template("income/form.html", categories=categories)
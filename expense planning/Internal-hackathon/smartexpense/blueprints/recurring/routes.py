@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_required, current_user
+from ...extensions import db
+from ...models import RecurringRule, Category
+from ...services.recurring import FREQUENCIES, MAX_BACKFILL_DAYS, materialize_due
+
+recurring_bp = Blueprint("recurring", __name__, url_prefix="/recurring")
+
+
+@recurring_bp.route("/", methods=["GET", "POST"])
+@login_required
+def manage_rules():
+    categories = Category.query.filter_by(user_id=current_user.id).order_by(Category.type, Category.name).all()
+
+    if request.method == "POST":
+        title = (request.form.get("title") or "").strip()
+        amount_raw = request.form.get("amount")
+        category_id = request.form.get("category_id")
+        frequency = request.form.get("frequency") or "monthly"
+        if not title or not amount_raw or not category_id or frequency not in FREQUENCIES:
+            flash("Please fill Title, Amount, Category and Frequency", "danger")
+            return redirect(url_for("recurring.manage_rules"))
+        # Only allow the user's own categories
+        if not Category.query.filter_by(id=category_id, user_id=current_user.id).first():
+            flash("Unknown category", "danger")
+            return redirect(url_for("recurring.manage_rules"))
+        try:
+            amount = float(amount_raw)
+            start_str = request.form.get("start_on")
+            end_str = request.form.get("end_on")
+            start_on = date.fromisoformat(start_str) if start_str else date.today()
+            end_on = date.fromisoformat(end_str) if end_str else None
+            interval_days = int(request.form.get("interval_days") or 0) or None
+        except ValueError:
+            flash("Invalid amount, date or interval", "danger")
+            return redirect(url_for("recurring.manage_rules"))
+        if amount <= 0:
+            flash("Amount must be greater than zero", "danger")
+            return redirect(url_for("recurring.manage_rules"))
+        if frequency == "custom" and not interval_days:
+            flash("Custom rules need an interval in days", "danger")
+            return redirect(url_for("recurring.manage_rules"))
+        if start_on < date.today() - timedelta(days=MAX_BACKFILL_DAYS):
+            flash("Start date can be at most a year in the past", "danger")
+            return redirect(url_for("recurring.manage_rules"))
+        if end_on and end_on < start_on:
+            flash("End date must be after the start date", "danger")
+            return redirect(url_for("recurring.manage_rules"))
+
+        db.session.add(RecurringRule(
+            user_id=current_user.id,
+            category_id=int(category_id),
+            title=title,
+            amount=amount,
+            payment_mode=request.form.get("payment_mode"),
+            note=request.form.get("note"),
+            frequency=frequency,
+            interval_days=interval_days if frequency == "custom" else None,
+            start_on=start_on,
+            end_on=end_on,
+            next_run_on=start_on,
+        ))
+        db.session.commit()
+        # Post an occurrence due today right away; earlier ones (a start date
+        # in the past) are backfilled by the scheduled `recurring run`
+        _, created = materialize_due(user_id=current_user.id, only_today=True)
+        flash(f"Recurring rule saved ({created} occurrence(s) posted)", "success")
+        return redirect(url_for("recurring.manage_rules"))
+
+    rules = RecurringRule.query.filter_by(user_id=current_user.id).order_by(RecurringRule.created_at.desc()).all()
+    return render_template("recurring/list.html", rules=rules, categories=categories,
+                           frequencies=FREQUENCIES, today=date.today().isoformat())
+
+
+@recurring_bp.route("/<int:rule_id>/toggle", methods=["POST"])
+@login_required
+def toggle_rule(rule_id):
+    rule = RecurringRule.query.filter_by(id=rule_id, user_id=current_user.id).first_or_404()
+    rule.active = not rule.active
+    db.session.commit()
+    flash("Rule resumed" if rule.active else "Rule paused", "info")
+    return redirect(url_for("recurring.manage_rules"))
+
+
+@recurring_bp.route("/<int:rule_id>/delete", methods=["POST"])
+@login_required
+def delete_rule(rule_id):
+    rule = RecurringRule.query.filter_by(id=rule_id, user_id=current_user.id).first_or_404()
+    # Already posted occurrences stay; only future ones stop
+    db.session.delete(rule)
+    db.session.commit()
+    flash("Recurring rule deleted", "info")
+    return redirect(url_for("recurring.manage_rules"))
@@ -2,10 +2,12 @@ import csv
 from io import StringIO
 from datetime import date
 from sqlalchemy import func
-from flask import Blueprint, render_template, request, make_response
+from flask import Blueprint, render_template, request, make_response, send_file, abort
 from flask_login import login_required, current_user
 from ...extensions import db
 from ...models import Expense, Category
+from ...services.statements import get_statement
+from ...services.history import expense_rows, monthly_totals
 
 reports_bp = Blueprint("reports", __name__, url_prefix="/reports")
 
@@ -24,8 +26,10 @@ def index():
     savings = tracked_savings if tracked_savings > 0 else max(0.0, total_income - total_expense)
     labels = ["Expenses", "Income", "Savings"]
     data = [float(total_expense), float(total_income), float(savings)]
+    trend = monthly_totals(current_user.id, "expense")
     return render_template("reports/index.html", labels=labels, data=data, month=month,
-                           totals={"expense": total_expense, "income": total_income, "savings": savings})
+                           totals={"expense": total_expense, "income": total_income, "savings": savings},
+                           trend={"labels": [m for m, _ in trend], "data": [t for _, t in trend]})
 
 
 @reports_bp.route("/export.csv")
@@ -34,9 +38,22 @@ def export_csv():
     output = StringIO()
     writer = csv.writer(output)
     writer.writerow(["Title", "Category", "Amount", "Payment", "Date", "Note"])
-    for exp, cat in Expense.query.filter_by(user_id=current_user.id).join(Category, Expense.category_id==Category.id).add_columns(Category.name).all():
-        writer.writerow([exp.title, cat, f"{exp.amount:.2f}", exp.payment_mode or "", exp.spent_on.isoformat(), exp.note or ""]) 
+    for exp in db.session.execute(expense_rows(current_user.id)):
+        writer.writerow([exp.title, exp.category_name or "", f"{exp.amount:.2f}", exp.payment_mode or "", exp.spent_on.isoformat(), exp.note or ""])
     response = make_response(output.getvalue())
     response.headers["Content-Disposition"] = "attachment; filename=expenses.csv"
     response.headers["Content-Type"] = "text/csv"
     return response
+
+
+@reports_bp.route("/statement.pdf")
+@login_required
+def statement_pdf():
+    month = request.args.get("month") or date.today().strftime('%Y-%m')
+    try:
+        date.fromisoformat(f"{month}-01")
+    except ValueError:
+        abort(400)
+    path = get_statement(current_user.id, month)
+    return send_file(path, mimetype="application/pdf", as_attachment=True,
+                     download_name=f"statement-{month}.pdf")
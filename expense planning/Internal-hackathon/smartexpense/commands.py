@@ -0,0 +1,212 @@
+import click
+from datetime import date
+from flask.cli import AppGroup, with_appcontext, pass_script_info
+from .sharding import fan_out
+
+statements_cli = AppGroup("statements", help="Monthly PDF statements.")
+
+
+@statements_cli.command("build")
+@click.option("--month", default=lambda: date.today().strftime("%Y-%m"), help="Month as YYYY-MM.")
+@click.option("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+def build_statements(month, workers):
+    """Render statements for all users for a month."""
+    from .services.statements import render_all
+    users, rendered = render_all(month, workers=workers)
+    click.echo(f"{users} user(s), {rendered} statement(s) rendered, {users - rendered} cached")
+
+
+recurring_cli = AppGroup("recurring", help="Recurring transaction rules.")
+
+
+@recurring_cli.command("run")
+@click.option("--date", "on_date", default=None, help="Materialize occurrences due up to this date (YYYY-MM-DD).")
+@click.option("--batch-size", type=int, default=5000, show_default=True)
+def run_recurring(on_date, batch_size):
+    """Post every due occurrence of all active recurring rules."""
+    from .services.recurring import materialize_due
+    today = date.fromisoformat(on_date) if on_date else None
+    results = fan_out(lambda shard: materialize_due(today=today, batch_size=batch_size))
+    rules, created = (sum(col) for col in zip(*results))
+    click.echo(f"{rules} rule(s) processed, {created} transaction(s) posted")
+
+
+archive_cli = AppGroup("archive", help="Hot/cold archival of old expenses.")
+
+
+@archive_cli.command("run")
+@click.option("--horizon", type=int, default=None, help="Months kept hot (default: ARCHIVE_HORIZON_MONTHS).")
+@click.option("--chunk-size", type=int, default=5000, show_default=True)
+def run_archive(horizon, chunk_size):
+    """Move closed months older than the horizon into yearly archive tables."""
+    from .services.history import archive_closed_months, archive_cutoff
+    moved = sum(fan_out(lambda shard: archive_closed_months(horizon_months=horizon, chunk_size=chunk_size)))
+    click.echo(f"{moved} expense(s) archived (cutoff {archive_cutoff(horizon_months=horizon)})")
+
+
+budgets_cli = AppGroup("budgets", help="Budget states and alerts.")
+
+
+@budgets_cli.command("rebuild")
+@click.option("--user", "user_id", type=int, default=None, help="Only this user.")
+@click.option("--month", default=None, help="Only this month (YYYY-MM).")
+@click.option("--batch-users", type=int, default=500, show_default=True)
+def rebuild_budgets(user_id, month, batch_users):
+    """Re-evaluate budget states from the data, e.g. after a bulk import."""
+    from .services.budgets import rebuild
+    from .sharding import get_router
+
+    def run(shard):
+        # A single user only has data on their own shard
+        if user_id is not None and shard is not None and get_router().shard_for(user_id) != shard:
+            return 0, 0
+        return rebuild(user_id=user_id, month=month, batch_users=batch_users)
+
+    users, alerts = (sum(col) for col in zip(*fan_out(run)))
+    click.echo(f"{users} user(s) re-evaluated, {alerts} alert(s) recorded")
+
+
+shards_cli = AppGroup("shards", help="User-sharded storage (SHARD_COUNT > 0).")
+
+
+def _require_router():
+    from .sharding import get_router
+    router = get_router()
+    if router is None:
+        raise click.ClickException("Sharding is disabled (SHARD_COUNT=0)")
+    return router
+
+
+@shards_cli.command("stats")
+def shard_stats():
+    """Users and expenses per shard."""
+    from sqlalchemy import func
+    from .extensions import db
+    from .models import Expense, UserShard
+    _require_router()
+    users = dict(db.session.query(UserShard.shard, func.count()).group_by(UserShard.shard).all())
+
+    def count_expenses(shard):
+        return db.session.query(func.count(Expense.id)).scalar()
+
+    for shard, expenses in enumerate(fan_out(count_expenses)):
+        click.echo(f"shard {shard}: {users.get(shard, 0)} user(s), {expenses} expense row(s)")
+
+
+@shards_cli.command("move")
+@click.option("--user", "user_id", type=int, required=True)
+@click.option("--to", "target", type=int, required=True)
+def shard_move(user_id, target):
+    """Move one user's data to another shard."""
+    from .sharding import move_user
+    router = _require_router()
+    if not 0 <= target < router.count:
+        raise click.BadParameter(f"shard must be between 0 and {router.count - 1}", param_hint="--to")
+    copied = move_user(user_id, target)
+    click.echo(f"user {user_id}: {copied} row(s) moved to shard {target}")
+
+
+@shards_cli.command("rebalance")
+@click.option("--max-moves", type=int, default=None)
+def shard_rebalance(max_moves):
+    """Even out the number of users per shard."""
+    from .sharding import rebalance
+    _require_router()
+    moves = rebalance(max_moves=max_moves)
+    for user_id, src, dst in moves:
+        click.echo(f"user {user_id}: shard {src} -> {dst}")
+    click.echo(f"{len(moves)} user(s) moved")
+
+
+account_cli = AppGroup("account", help="Whole-account export and deletion.")
+
+
+@account_cli.command("export")
+@click.option("--user", "user_id", type=int, required=True)
+@click.option("--chunk-size", type=int, default=5000, show_default=True)
+def account_export(user_id, chunk_size):
+    """Write a zip with all of a user's data."""
+    from .services.account import export_account
+    try:
+        path = export_account(user_id, chunk_size=chunk_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"user {user_id}: exported to {path}")
+
+
+@account_cli.command("purge")
+@click.option("--user", "user_id", type=int, required=True)
+@click.option("--chunk-size", type=int, default=5000, show_default=True)
+@click.confirmation_option(prompt="Delete this user and all of their data?")
+def account_purge(user_id, chunk_size):
+    """Delete a user and everything they own."""
+    from .services.account import purge_account
+    deleted = purge_account(user_id, chunk_size=chunk_size)
+    for table, n in deleted.items():
+        if n:
+            click.echo(f"{table}: {n} row(s)")
+    click.echo(f"user {user_id}: {sum(deleted.values())} row(s) deleted")
+
+
+@click.command("loadtest")
+@click.option("--profile", "profile_path", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="JSON profile (see loadtest_profiles/).")
+@click.option("--url", default=None, help="Drive a running server instead of the in-process app.")
+@click.option("--users", type=int, default=None, help="Override the profile's user count.")
+@click.option("--duration", type=float, default=None, help="Override the profile's duration in seconds.")
+@click.option("--out", type=click.Path(dir_okay=False), default=None, help="Write the JSON report here.")
+@click.option("--keep-users", is_flag=True, help="Keep the simulated accounts instead of purging them.")
+@with_appcontext
+def loadtest_command(profile_path, url, users, duration, out, keep_users):
+    """Run a concurrent load test and report latency, errors and lock contention."""
+    import json
+    from flask import current_app
+    from .loadtest import load_profile, run
+    profile = load_profile(profile_path, users=users, duration_s=duration)
+    if url:
+        report = run(profile, base_url=url, keep_users=keep_users)
+    else:
+        report = run(profile, app=current_app._get_current_object(), keep_users=keep_users)
+    text = json.dumps(report, indent=2)
+    if out:
+        with open(out, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    click.echo(text)
+
+
+@click.command("serve")
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", type=int, default=5000, show_default=True)
+@click.option("--workers", type=int, default=None, help="Worker processes (default: SERVE_WORKERS, 0 = CPU count).")
+@click.option("--threads/--no-threads", default=None, help="Threaded workers (default: SERVE_THREADED).")
+@click.option("--graceful-timeout", type=float, default=30, show_default=True,
+              help="Seconds workers get to finish in-flight requests on shutdown.")
+@pass_script_info
+def serve_command(info, host, port, workers, threads, graceful_timeout):
+    """Serve the app with several pre-forked worker processes."""
+    import os
+    from .serve import serve
+    app = info.load_app()
+    if workers is None:
+        workers = app.config.get("SERVE_WORKERS") or 0
+    workers = workers or os.cpu_count() or 1
+    if threads is None:
+        threads = app.config.get("SERVE_THREADED", True)
+    if workers > 1 and (app.config.get("SQLITE_JOURNAL_MODE") or "").lower() != "wal":
+        click.echo("Hint: set SQLITE_JOURNAL_MODE=WAL so readers in one worker do not block writers in another.",
+                   err=True)
+    try:
+        serve(app, host=host, port=port, workers=workers, threaded=threads, graceful_timeout=graceful_timeout)
+    except (RuntimeError, OSError) as e:
+        raise click.ClickException(str(e))
+
+
+def register_commands(app):
+    app.cli.add_command(statements_cli)
+    app.cli.add_command(recurring_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(budgets_cli)
+    app.cli.add_command(shards_cli)
+    app.cli.add_command(account_cli)
+    app.cli.add_command(loadtest_command)
+    app.cli.add_command(serve_command)
@@ -0,0 +1,184 @@
+"""Optional group commit for write routes.
+
+SQLite serializes writers and every ``commit()`` is an fsync, so under bursty
+load requests mostly wait on each other's commits. With ``GROUP_COMMIT``
+enabled, write routes hand a *unit of work* to a single writer thread
+instead of committing themselves. The writer collects whatever arrives within
+``GROUP_COMMIT_WINDOW_MS``, runs the units one after another in one session
+and commits them together, then wakes every waiting request with its own
+result.
+
+A unit of work is a plain callable that uses ``db.session`` and returns a
+value. It runs in the writer's app context, so it must not touch
+``request`` or ``current_user``; capture what it needs first. Because units
+in a batch share one session, later units see earlier units' pending rows
+(autoflush), which keeps budget checks correct within a batch. If any unit
+raises or the commit fails, the batch is rolled back and each unit is
+replayed in its own transaction, so one bad write cannot fail its
+neighbours. Units must therefore validate before they add anything and be
+safe to run twice.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from .extensions import db
+from .sharding import get_router, bind_shard
+
+
+class _Job:
+    __slots__ = ("work", "user_id", "future")
+
+    def __init__(self, work, user_id):
+        self.work = work
+        self.user_id = user_id
+        self.future = Future()
+
+
+class CommitQueue:
+    def __init__(self, app, window_ms=2, max_batch=200, timeout=30):
+        self.app = app
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.jobs = 0
+        self.replays = 0
+
+    def _ensure_started(self):
+        # Started lazily (and again after a fork) so each process has its own writer
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="commit-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, work, user_id=None):
+        """Run ``work`` in the next group commit and return its result."""
+        self._ensure_started()
+        job = _Job(work, user_id)
+        self._queue.put(job)
+        try:
+            return job.future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Withdraw the job so it is not committed after we report failure.
+            # If the writer already started it, its outcome is ours to report.
+            if job.future.cancel():
+                raise
+            return job.future.result()
+
+    def stats(self):
+        return {"batches": self.batches, "jobs": self.jobs, "replays": self.replays,
+                "pending": self._queue.qsize()}
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self.app.app_context():
+                try:
+                    self._process(batch)
+                except Exception as e:  # never let the writer die
+                    for job in batch:
+                        if not job.future.done():
+                            job.future.set_exception(e)
+                finally:
+                    db.session.remove()
+
+    def _process(self, batch):
+        groups = {}
+        router = get_router()
+        for job in batch:
+            shard = router.shard_for(job.user_id) if router is not None and job.user_id is not None else None
+            groups.setdefault(shard, []).append(job)
+
+        for shard, jobs in groups.items():
+            # Skip jobs whose request gave up waiting (see submit)
+            jobs = [job for job in jobs if job.future.set_running_or_notify_cancel()]
+            if not jobs:
+                continue
+            if shard is not None:
+                bind_shard(shard)
+            try:
+                results = [job.work() for job in jobs]
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self._replay(jobs)
+            else:
+                for job, result in zip(jobs, results):
+                    job.future.set_result(result)
+            self.batches += 1
+            self.jobs += len(jobs)
+
+    def _replay(self, jobs):
+        self.replays += 1
+        for job in jobs:
+            try:
+                result = job.work()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+
+
+def run_write(work, user_id=None):
+    """Run a unit of work and commit it, through the writer when enabled.
+
+    Without ``GROUP_COMMIT`` this is simply ``work()`` followed by a commit
+    (and a rollback on error) in the calling request.
+    """
+    q = current_app.extensions.get("commit_queue")
+    if q is not None:
+        # Hand our pooled connection back before blocking, otherwise enough
+        # waiting requests starve the writer of connections. close() keeps
+        # already loaded objects (e.g. current_user) usable as detached.
+        db.session.close()
+        return q.submit(work, user_id)
+    try:
+        result = work()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+def init_app(app):
+    if not app.config.get("GROUP_COMMIT"):
+        return
+    app.extensions["commit_queue"] = CommitQueue(
+        app,
+        window_ms=app.config.get("GROUP_COMMIT_WINDOW_MS", 2),
+        max_batch=app.config.get("GROUP_COMMIT_MAX_BATCH", 200),
+    )
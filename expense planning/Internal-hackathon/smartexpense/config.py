@@ -9,4 +9,30 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", f"sqlite:///{BASE_DIR / 'smartexpense.db'}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-
+    # SQLite journal mode for every connection, e.g. WAL; empty leaves the driver default
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "")
+    # Where rendered PDF statements are cached; defaults to <instance>/statements
+    STATEMENT_CACHE_DIR = os.getenv("STATEMENT_CACHE_DIR")
+    # Where full-account exports are written; defaults to <instance>/exports
+    EXPORT_DIR = os.getenv("EXPORT_DIR")
+    # A budget counts as "near" once spending reaches this share of its limit
+    BUDGET_NEAR_RATIO = float(os.getenv("BUDGET_NEAR_RATIO", "0.9"))
+    # Months older than this many full months are moved to yearly archive tables
+    ARCHIVE_HORIZON_MONTHS = int(os.getenv("ARCHIVE_HORIZON_MONTHS", "12"))
+    # 0 keeps everything in SQLALCHEMY_DATABASE_URI; N > 0 splits user data across N shard files
+    SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+    SHARD_URL_TEMPLATE = os.getenv("SHARD_URL_TEMPLATE", "sqlite:///{instance}/shard_{n}.db")
+    # Batch concurrent expense/income/savings inserts into one commit on a writer thread
+    GROUP_COMMIT = os.getenv("GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+    GROUP_COMMIT_WINDOW_MS = int(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+    GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "200"))
+    # Seconds a logged-in user's row is reused across requests (per process); 0 disables
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "30"))
+    # Werkzeug hash method for passwords, e.g. scrypt:16384:8:1; older hashes are upgraded at login
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+    # Threads that hash passwords, and how many more hashes may queue for them
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "32"))
+    # `flask serve`: worker processes (0 = one per CPU) and whether each one is threaded
+    SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", "0"))
+    SERVE_THREADED = os.getenv("SERVE_THREADED", "1").lower() in ("1", "true", "yes")
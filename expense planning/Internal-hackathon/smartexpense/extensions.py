@@ -1,9 +1,23 @@
+from sqlalchemy import event
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from .sharding import ShardedSession
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": ShardedSession})
 migrate = Migrate()
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"
+
+
+def configure_sqlite(engine, journal_mode=None):
+    """Apply SQLITE_JOURNAL_MODE (e.g. WAL) to every new connection of ``engine``."""
+    if engine.dialect.name != "sqlite" or not journal_mode:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_journal_mode(dbapi_conn, record):
+        cur = dbapi_conn.cursor()
+        cur.execute(f"PRAGMA journal_mode={journal_mode}")
+        cur.close()
@@ -0,0 +1,301 @@
+"""Concurrent load test for SmartExpense.
+
+Simulated users log in and replay a weighted mix of the app's hot paths:
+dashboard views, ``/expenses/check-budget`` calls as fired by
+``expenses/form.html``, multi-row ``create_expense`` posts, CSV exports and
+fresh logins. Runs either in-process (Flask test client, no server needed)
+or against a running server over HTTP.
+
+Profiles are JSON files (see ``loadtest_profiles/``)::
+
+    {
+      "users": 16,             # concurrent simulated users
+      "duration_s": 30,        # wall-clock length of the measured phase
+      "think_ms": 0,           # pause between a user's requests
+      "seed": 42,              # makes the request sequence repeatable
+      "rows_per_post": [1, 3], # expenses per create_expense post
+      "mix": {"dashboard": 5, "check_budget": 4, "create_expense": 3,
+              "export_csv": 1, "login": 1}
+    }
+
+The report is plain JSON so runs with different settings (``GROUP_COMMIT``,
+``SQLITE_JOURNAL_MODE``, ``SHARD_COUNT``, serve workers...) can be diffed.
+"""
+import http.cookiejar
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import date
+
+from flask import got_request_exception
+
+DEFAULT_PROFILE = {
+    "users": 8,
+    "duration_s": 20,
+    "think_ms": 0,
+    "seed": 42,
+    "rows_per_post": [1, 3],
+    "mix": {"dashboard": 5, "check_budget": 4, "create_expense": 3, "export_csv": 1, "login": 1},
+}
+PASSWORD = "loadtest-pw"
+LOCKED = "database is locked"
+_OPTION_RE = re.compile(r'<option value="(\d+)"')
+
+
+def load_profile(path=None, **overrides):
+    profile = dict(DEFAULT_PROFILE)
+    if path:
+        with open(path, encoding="utf-8") as fh:
+            profile.update(json.load(fh))
+    profile.update({k: v for k, v in overrides.items() if v is not None})
+    return profile
+
+
+class _InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, json_body=None):
+        r = self.client.open(path, method=method, data=data, json=json_body)
+        return r.status_code, r.get_data(as_text=True)
+
+
+class _HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect,
+        )
+
+    def request(self, method, path, data=None, json_body=None):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as resp:
+                return resp.status, resp.read().decode("utf-8", "replace")
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode("utf-8", "replace")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Keep 302s visible (login/create return them on success) and the cookies they set
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.locked = 0
+
+    def record(self, endpoint, seconds, ok, locked=False):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            if locked:
+                self.locked += 1
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank: the smallest value with at least pct% of values at or below it
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class _User:
+    def __init__(self, index, client, profile, stats, run_id):
+        self.client = client
+        self.profile = profile
+        self.stats = stats
+        self.rng = random.Random(profile["seed"] * 1000 + index)
+        self.email = f"load-{run_id}-{index}@example.test"
+        self.category_ids = []
+        actions = profile["mix"]
+        self.actions = [a for a in actions if actions[a] > 0]
+        self.weights = [actions[a] for a in self.actions]
+
+    def call(self, endpoint, method, path, ok_statuses=(200, 302), **kwargs):
+        started = time.perf_counter()
+        try:
+            status, body = self.client.request(method, path, **kwargs)
+        except Exception as e:  # transport failure counts as an error
+            status, body = 599, str(e)
+        elapsed = time.perf_counter() - started
+        self.stats.record(endpoint, elapsed, status in ok_statuses, locked=LOCKED in body)
+        return status, body
+
+    def setup(self):
+        self.client.request("POST", "/auth/register", data={"name": "Load", "email": self.email, "password": PASSWORD})
+        self.client.request("POST", "/auth/login", data={"email": self.email, "password": PASSWORD})
+        self.client.request("GET", "/expenses/categories")
+        # Enough income that budget checks mostly pass and posts keep writing
+        self.client.request("POST", "/dashboard/add-income", data={"title": "Salary", "amount": "100000000"})
+        _, body = self.client.request("GET", "/expenses/create")
+        self.category_ids = _OPTION_RE.findall(body)
+
+    def teardown(self):
+        # Over HTTP the server purges the account in the background
+        self.client.request("POST", "/auth/login", data={"email": self.email, "password": PASSWORD})
+        self.client.request("POST", "/account/delete", data={"password": PASSWORD})
+
+    def step(self):
+        action = self.rng.choices(self.actions, self.weights)[0]
+        getattr(self, "do_" + action)()
+        if self.profile["think_ms"]:
+            time.sleep(self.profile["think_ms"] / 1000.0)
+
+    def _category(self):
+        return self.rng.choice(self.category_ids) if self.category_ids else ""
+
+    def do_login(self):
+        self.call("login", "POST", "/auth/login", data={"email": self.email, "password": PASSWORD})
+
+    def do_dashboard(self):
+        self.call("dashboard", "GET", "/dashboard/")
+
+    def do_check_budget(self):
+        self.call("check_budget", "POST", "/expenses/check-budget", json_body={
+            "amount": f"{self.rng.uniform(1, 500):.2f}",
+            "category_id": self._category(),
+            "spent_on": date.today().isoformat(),
+        })
+
+    def do_create_expense(self):
+        lo, hi = self.profile["rows_per_post"]
+        data = {}
+        for i in range(1, self.rng.randint(lo, min(hi, 3)) + 1):
+            data.update({
+                f"title_{i}": f"Load item {i}",
+                f"amount_{i}": f"{self.rng.uniform(1, 500):.2f}",
+                f"category_id_{i}": self._category(),
+                f"spent_on_{i}": date.today().isoformat(),
+                f"payment_mode_{i}": self.rng.choice(["Cash", "Card", "UPI"]),
+            })
+        self.call("create_expense", "POST", "/expenses/create", data=data)
+
+    def do_export_csv(self):
+        self.call("export_csv", "GET", "/reports/export.csv", ok_statuses=(200,))
+
+
+def _remove_users(app, users):
+    """Purge the simulated accounts and everything they posted."""
+    if app is None:
+        for u in users:
+            u.teardown()
+        return len(users)
+    from sqlalchemy import select
+    from .extensions import db
+    from .models import User
+    from .services.account import purge_account
+    with app.app_context():
+        ids = db.session.execute(select(User.id).where(User.email.in_([u.email for u in users]))).scalars().all()
+        db.session.commit()
+        for user_id in ids:
+            purge_account(user_id)
+        db.session.remove()
+    return len(ids)
+
+
+def run(profile, app=None, base_url=None, keep_users=False):
+    """Run a load test and return the report dict.
+
+    Pass ``app`` for an in-process run or ``base_url`` to drive a server.
+    The simulated users register real accounts in the target database;
+    they are purged afterwards unless ``keep_users`` is set.
+    """
+    if (app is None) == (base_url is None):
+        raise ValueError("pass exactly one of app or base_url")
+    stats = _Stats()
+    run_id = uuid.uuid4().hex[:8]
+
+    def make_client():
+        return _InProcessClient(app) if app is not None else _HttpClient(base_url)
+
+    def on_exception(sender, exception, **extra):
+        if LOCKED in str(exception):
+            with stats.lock:
+                stats.locked += 1
+
+    users = [_User(i, make_client(), profile, stats, run_id) for i in range(profile["users"])]
+    removed = 0
+    try:
+        for u in users:
+            u.setup()
+
+        if app is not None:
+            # A failing request must show up as a 500, not kill the simulated user
+            propagate = app.config.get("PROPAGATE_EXCEPTIONS")
+            app.config["PROPAGATE_EXCEPTIONS"] = False
+            got_request_exception.connect(on_exception, app)
+        stop_at = time.monotonic() + profile["duration_s"]
+
+        def loop(user):
+            while time.monotonic() < stop_at:
+                user.step()
+
+        threads = [threading.Thread(target=loop, args=(u,), daemon=True) for u in users]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+        if app is not None:
+            got_request_exception.disconnect(on_exception, app)
+            app.config["PROPAGATE_EXCEPTIONS"] = propagate
+    finally:
+        if not keep_users:
+            removed = _remove_users(app, users)
+
+    endpoints = {}
+    total = errors = 0
+    for name, values in sorted(stats.latencies.items()):
+        values.sort()
+        n = len(values)
+        err = stats.errors.get(name, 0)
+        total += n
+        errors += err
+        endpoints[name] = {
+            "requests": n,
+            "throughput_rps": round(n / elapsed, 2),
+            "error_rate": round(err / n, 4) if n else 0.0,
+            "p50_ms": round(_percentile(values, 50) * 1000, 2),
+            "p95_ms": round(_percentile(values, 95) * 1000, 2),
+            "p99_ms": round(_percentile(values, 99) * 1000, 2),
+        }
+
+    report = {
+        "profile": profile,
+        "target": base_url or "in-process",
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "database_locked_errors": stats.locked,
+        "load_users_removed": removed,
+        "endpoints": endpoints,
+    }
+    if app is not None:
+        report["config"] = {k: app.config.get(k) for k in (
+            "SQLITE_JOURNAL_MODE", "GROUP_COMMIT", "GROUP_COMMIT_WINDOW_MS", "SHARD_COUNT")}
+    return report
@@ -3,5 +3,11 @@ from .category import Category
 from .expense import Expense
 from .budget import Budget
 from .budget_category import BudgetCategory
+from .data_version import DataVersion
+from .recurring_rule import RecurringRule
+from .expense_summary import ExpenseMonthlySummary
+from .user_shard import UserShard
+from .budget_state import BudgetState, BudgetAlert
 
-__all__ = ["User", "Category", "Expense", "Budget", "BudgetCategory"]
+__all__ = ["User", "Category", "Expense", "Budget", "BudgetCategory", "DataVersion", "RecurringRule",
+           "ExpenseMonthlySummary", "UserShard", "BudgetState", "BudgetAlert"]
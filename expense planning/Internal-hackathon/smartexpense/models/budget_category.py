@@ -4,9 +4,12 @@ from ..extensions import db
 class BudgetCategory(db.Model):
     __tablename__ = "budget_categories"
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    category_id = db.Column(db.Integer, db.ForeignKey("categories.id"), nullable=False)
-    month = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    # active_history: the budget engine needs the old key when one changes
+    user_id = db.column_property(db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False),
+                                 active_history=True)
+    category_id = db.column_property(db.Column(db.Integer, db.ForeignKey("categories.id"), nullable=False),
+                                     active_history=True)
+    month = db.column_property(db.Column(db.String(7), nullable=False), active_history=True)  # YYYY-MM
     limit_amount = db.Column(db.Float, nullable=False)
 
     __table_args__ = (
@@ -0,0 +1,44 @@
+from datetime import datetime
+from ..extensions import db
+
+# category_id of the row that stands for the month as a whole
+MONTH_SCOPE = 0
+
+
+class BudgetState(db.Model):
+    """Running totals and precomputed thresholds of one budget scope.
+
+    One row per (user, month, expense category) that has spending or a
+    limit, plus a ``category_id`` = 0 row for the whole month. Only the
+    month row carries the month's income and savings. Kept up to date on
+    every expense write by ``services.budgets``.
+    """
+    __tablename__ = "budget_states"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 = whole month
+    spent = db.Column(db.Float, nullable=False, default=0.0)
+    income = db.Column(db.Float, nullable=False, default=0.0)
+    savings = db.Column(db.Float, nullable=False, default=0.0)
+    limit_amount = db.Column(db.Float)
+    near_at = db.Column(db.Float)  # limit_amount * BUDGET_NEAR_RATIO
+    status = db.Column(db.String(5), nullable=False, default="none")  # none/ok/near/over
+
+
+class BudgetAlert(db.Model):
+    """A budget scope changed status, e.g. ok -> near or near -> over."""
+    __tablename__ = "budget_alerts"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    month = db.Column(db.String(7), nullable=False)
+    category_id = db.Column(db.Integer, nullable=False)  # 0 = monthly budget
+    status = db.Column(db.String(5), nullable=False)
+    previous = db.Column(db.String(5), nullable=False)
+    spent = db.Column(db.Float, nullable=False)
+    limit_amount = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    seen = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index("ix_budget_alerts_user_seen", "user_id", "seen"),
+    )
@@ -0,0 +1,74 @@
+from datetime import date
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from ..extensions import db
+
+
+class DataVersion(db.Model):
+    """Per (user, month) counter bumped whenever that month's data changes.
+
+    Used as a cheap cache key for anything derived from a month of data
+    (e.g. PDF statements) without re-scanning the expenses table.
+    """
+    __tablename__ = "data_versions"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+def current_version(user_id, month):
+    # Read the column, not an identity-map object the upserts below bypass
+    version = db.session.execute(
+        select(DataVersion.version).where(DataVersion.user_id == user_id, DataVersion.month == month)
+    ).scalar()
+    return version or 0
+
+
+def bump_versions_bulk(session, keys):
+    """Increment the version of every (user_id, month) in ``keys``.
+
+    One atomic upsert, so concurrent writers never lose a bump. Bulk
+    ``insert()``/``update()`` statements bypass the flush hook below, so
+    callers that use them must bump the affected months themselves.
+    """
+    rows = [{"user_id": u, "month": m, "version": 1} for (u, m) in set(keys) if u is not None and m]
+    if not rows:
+        return
+    stmt = sqlite_insert(DataVersion)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DataVersion.user_id, DataVersion.month],
+        set_={"version": DataVersion.version + 1},
+    )
+    session.execute(stmt, rows)
+
+
+def _month_of(value):
+    return value.strftime("%Y-%m") if value is not None else None
+
+
+def _touched_months(obj):
+    """(user_id, month) pairs affected by a pending change to ``obj``."""
+    from .expense import Expense
+    from .budget_category import BudgetCategory
+
+    if isinstance(obj, Expense):
+        keys = {(obj.user_id, _month_of(obj.spent_on or date.today()))}
+        hist = inspect(obj).attrs.spent_on.history
+        keys.update((obj.user_id, _month_of(v)) for v in hist.deleted or ())
+        return keys
+    if isinstance(obj, BudgetCategory):
+        return {(obj.user_id, obj.month)}
+    return set()
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_on_flush(session, flush_context, instances):
+    keys = set()
+    for obj in list(session.new) + list(session.deleted):
+        keys |= _touched_months(obj)
+    for obj in list(session.dirty):
+        if session.is_modified(obj, include_collections=False):
+            keys |= _touched_months(obj)
+    if keys:
+        bump_versions_bulk(session, keys)
@@ -4,11 +4,19 @@ from ..extensions import db
 
 class Expense(db.Model):
     __tablename__ = "expenses"
+    # active_history: the budget engine and data versions need the old value
+    # of these on every change, even when the row was expired (e.g. by a commit)
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    user_id = db.column_property(db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False),
+                                 active_history=True)
     title = db.Column(db.String(200), nullable=False)
-    category_id = db.Column(db.Integer, db.ForeignKey("categories.id"), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    category_id = db.column_property(db.Column(db.Integer, db.ForeignKey("categories.id"), nullable=False),
+                                     active_history=True)
+    amount = db.column_property(db.Column(db.Float, nullable=False), active_history=True)
     payment_mode = db.Column(db.String(50))  # Cash/Card/UPI
-    spent_on = db.Column(db.Date, default=date.today, nullable=False)
+    spent_on = db.column_property(db.Column(db.Date, default=date.today, nullable=False), active_history=True)
     note = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index("ix_expenses_user_spent_on", "user_id", "spent_on"),
+    )
@@ -0,0 +1,11 @@
+from ..extensions import db
+
+
+class ExpenseMonthlySummary(db.Model):
+    """Per (user, month, category) totals left behind for archived months."""
+    __tablename__ = "expense_monthly_summaries"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    category_id = db.Column(db.Integer, db.ForeignKey("categories.id"), primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    count = db.Column(db.Integer, nullable=False, default=0)
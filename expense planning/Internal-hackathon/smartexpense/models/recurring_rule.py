@@ -0,0 +1,29 @@
+from datetime import datetime
+from ..extensions import db
+
+
+class RecurringRule(db.Model):
+    __tablename__ = "recurring_rules"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey("categories.id"), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    payment_mode = db.Column(db.String(50))
+    note = db.Column(db.Text)
+    frequency = db.Column(db.String(10), nullable=False, default="monthly")  # monthly/weekly/custom
+    interval_days = db.Column(db.Integer)  # only for 'custom'
+    start_on = db.Column(db.Date, nullable=False)
+    end_on = db.Column(db.Date)
+    # High-water mark: date of the next occurrence not yet materialized.
+    # NULL once the rule has run past its end date.
+    next_run_on = db.Column(db.Date)
+    run_count = db.Column(db.Integer, nullable=False, default=0)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    category = db.relationship("Category")
+
+    __table_args__ = (
+        db.Index("ix_recurring_due", "next_run_on"),
+    )
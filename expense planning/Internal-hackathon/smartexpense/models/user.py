@@ -1,7 +1,11 @@
+import time
 from datetime import datetime
+from flask import current_app
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event, select, inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from ..extensions import db, login_manager
+from .. import passwords
 
 
 class User(UserMixin, db.Model):
@@ -16,13 +20,68 @@ class User(UserMixin, db.Model):
     expenses = db.relationship("Expense", backref="user", lazy=True, cascade="all, delete-orphan")
     budgets = db.relationship("Budget", backref="user", lazy=True, cascade="all, delete-orphan")
 
+    # Ids of purged accounts are never handed out again
+    __table_args__ = {"sqlite_autoincrement": True}
+
     def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self) -> bool:
+        return passwords.needs_rehash(self.password_hash)
+
+
+# Per-process cache of recently loaded users: id -> (expires_at, column values).
+# The password hash is left out; it is loaded on demand if ever needed.
+_user_cache = {}
+_USER_CACHE_MAX = 10000
+_CACHED_COLUMNS = ("id", "name", "email", "created_at")
+
+
+def invalidate_user(user_id):
+    _user_cache.pop(user_id, None)
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    user_id = int(user_id)
+    ttl = current_app.config.get("USER_CACHE_TTL", 0)
+    if ttl > 0:
+        hit = _user_cache.get(user_id)
+        if hit is not None and hit[0] > time.monotonic():
+            # One primary-key probe per request: an account deleted in another
+            # process must stop working at once, not when this entry expires
+            if db.session.execute(select(User.id).where(User.id == user_id)).first() is None:
+                invalidate_user(user_id)
+                return None
+            user = User(**hit[1])
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+    user = db.session.get(User, user_id)
+    if user is not None and ttl > 0:
+        if len(_user_cache) >= _USER_CACHE_MAX:
+            _user_cache.clear()
+        _user_cache[user_id] = (time.monotonic() + ttl, {k: getattr(user, k) for k in _CACHED_COLUMNS})
+    return user
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_write(mapper, connection, target):
+    invalidate_user(target.id)
+    # Drop it again once committed, in case another request re-cached the old
+    # row between this flush and the commit
+    sa_inspect(target).session.info.setdefault("changed_users", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop("changed_users", ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_users", None)
@@ -0,0 +1,8 @@
+from ..extensions import db
+
+
+class UserShard(db.Model):
+    """Directory entry pinning a user's data to one shard database."""
+    __tablename__ = "user_shards"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    shard = db.Column(db.Integer, nullable=False, index=True)
@@ -0,0 +1,95 @@
+"""Tunable password hashing on a bounded thread pool.
+
+``PASSWORD_HASH_METHOD`` takes any Werkzeug method string (``scrypt``,
+``scrypt:16384:8:1``, ``pbkdf2:sha256:600000``...). New passwords use it, and
+a stored hash made with different parameters is upgraded the next time its
+owner logs in (see :func:`needs_rehash`).
+
+Hashing and verification run on ``PASSWORD_HASH_WORKERS`` threads shared by
+the whole process, so a burst of logins/registrations occupies at most that
+many cores while other requests keep being served. At most
+``PASSWORD_HASH_QUEUE`` further calls may wait for a free thread; beyond that
+:class:`HashingBusy` is raised immediately instead of parking more request
+threads behind the pool.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusy(RuntimeError):
+    """Raised when the hashing pool and its wait queue are full."""
+
+
+class PasswordHasher:
+    def __init__(self, method="scrypt", workers=2, queue_size=32, timeout=30):
+        self.method = method
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        # Normalized "method:params" prefix of hashes made now; also rejects a
+        # bad method string at startup rather than at the first login.
+        self.prefix = generate_password_hash("", method).split("$", 1)[0]
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._slots = None
+
+    def _ensure_started(self):
+        # Pool threads do not survive a fork, so each process builds its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwhash")
+                self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+                self._pid = os.getpid()
+
+    def _call(self, fn, *args):
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("too many password hashes in progress")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def hash(self, password):
+        return self._call(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._call(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split("$", 1)[0] != self.prefix
+
+
+def _hasher():
+    return current_app.extensions["password_hasher"]
+
+
+def hash_password(password):
+    return _hasher().hash(password)
+
+
+def verify_password(pwhash, password):
+    return _hasher().verify(pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """True if ``pwhash`` was made with other settings than PASSWORD_HASH_METHOD."""
+    return _hasher().needs_rehash(pwhash)
+
+
+def init_app(app):
+    app.extensions["password_hasher"] = PasswordHasher(
+        method=app.config.get("PASSWORD_HASH_METHOD") or "scrypt",
+        workers=app.config.get("PASSWORD_HASH_WORKERS", 2),
+        queue_size=app.config.get("PASSWORD_HASH_QUEUE", 32),
+    )
@@ -0,0 +1,235 @@
+"""Pre-forking multi-worker server.
+
+``flask --app wsgi serve`` imports and builds the app once in a master
+process, opens the listening socket, then forks ``--workers`` copies that
+all accept on it. Each worker runs Werkzeug's server, threaded by default.
+After the fork a worker drops the pooled SQLite connections it inherited
+(plain and shard engines), so no connection is ever shared between
+processes. Per-process helpers (group-commit writer, password hashing
+pool) start fresh on first use.
+
+SIGTERM (or Ctrl+C) stops the master and tells every worker to stop
+accepting. A worker finishes its in-flight requests and exits. Workers
+still running after ``--graceful-timeout`` seconds are killed. A worker
+that dies unexpectedly is replaced.
+
+Every worker answers ``/healthz`` with its own pid, request counters and
+database status. A request lands on whichever worker accepts it, so
+repeated calls sample all workers.
+"""
+import contextvars
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from flask import current_app, jsonify, got_request_exception, request_started, request_tearing_down
+from sqlalchemy import text
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+from .extensions import db
+
+
+class WorkerStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset(None)
+
+    def reset(self, index, threaded=None):
+        self.index = index
+        self.threaded = threaded
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.requests = 0
+        self.in_flight = 0
+        self.errors = 0
+        self.draining = False
+
+    def begin(self, *args, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self, *args, **kwargs):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+
+    def error(self, *args, **kwargs):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self):
+        return {
+            "pid": self.pid,
+            "worker": self.index,
+            "threaded": self.threaded,
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "errors": self.errors,
+            "draining": self.draining,
+        }
+
+
+stats = WorkerStats()
+
+
+class _RequestHandler(WSGIRequestHandler):
+    # Idle keep-alive connections are dropped after this long, so a draining
+    # worker is not held open by clients that never hang up
+    timeout = 10
+
+
+def _log(message):
+    print(f"[serve {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+def release_connections(app, close=True):
+    """Dispose every engine's pool; ``close=False`` after a fork.
+
+    In a forked child the inherited connections belong to the parent, so
+    they are dropped without being closed.
+    """
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+        router = app.extensions.get("shards")
+        if router is not None:
+            router.dispose()
+
+
+def _run_worker(app, sock, index, threaded):
+    stats.reset(index, threaded)
+    server = make_server(sock.getsockname()[0], sock.getsockname()[1], app, threaded=threaded,
+                         request_handler=_RequestHandler, fd=sock.fileno())
+    # Non-daemon request threads are joined by server_close(), i.e. drained
+    server.daemon_threads = False
+
+    def stop(signum, frame):
+        if not stats.draining:
+            stats.draining = True
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    _log(f"worker {index} listening on http://{sock.getsockname()[0]}:{server.port}")
+    try:
+        # Without threads, requests run on this thread, where the CLI's app
+        # context is still pushed. Flask would reuse it (and g, current_user
+        # and db.session with it) for every request, so serve from an empty
+        # context and let each request push its own.
+        contextvars.Context().run(server.serve_forever)
+    finally:
+        server.server_close()
+    _log(f"worker {index} stopped after {stats.requests} request(s)")
+
+
+def _fork_worker(app, sock, index, threaded):
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        release_connections(app, close=False)
+        _run_worker(app, sock, index, threaded)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        code = 1
+    finally:
+        # Never run the master's atexit handlers or return into its code
+        os._exit(code)
+
+
+def serve(app, host="127.0.0.1", port=5000, workers=1, threaded=True, graceful_timeout=30):
+    """Serve ``app`` with ``workers`` processes until SIGTERM/SIGINT."""
+    workers = max(1, workers)
+    if workers > 1 and not hasattr(os, "fork"):
+        raise RuntimeError("multiple workers need os.fork(), which this platform lacks")
+    sock = socket.create_server((host, port), backlog=1024)
+    release_connections(app)
+
+    if workers == 1:
+        try:
+            _run_worker(app, sock, 0, threaded)
+        finally:
+            sock.close()
+        return
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    children = {}  # pid -> (worker index, start time)
+    for index in range(workers):
+        children[_fork_worker(app, sock, index, threaded)] = (index, time.monotonic())
+    _log(f"master started {workers} worker(s)")
+
+    while not stopping:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if not pid:
+            time.sleep(0.2)
+            continue
+        index, started = children.pop(pid, (None, 0))
+        if index is None or stopping:
+            continue
+        _log(f"worker {index} (pid {pid}) exited with status {status}; restarting")
+        if time.monotonic() - started < 1:
+            time.sleep(1)  # do not spin if a worker dies right at startup
+        children[_fork_worker(app, sock, index, threaded)] = (index, time.monotonic())
+
+    _log("stopping workers")
+    for pid in children:
+        _signal(pid, signal.SIGTERM)
+    # New connections are refused from here on instead of queueing unanswered
+    sock.close()
+    deadline = time.monotonic() + graceful_timeout
+    while children and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            children.pop(pid, None)
+        else:
+            time.sleep(0.1)
+    for pid in children:
+        _log(f"pid {pid} did not stop in {graceful_timeout}s; killing it")
+        _signal(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    _log("master stopped")
+
+
+def _signal(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+def healthz():
+    body = stats.snapshot()
+    status = 503 if body["draining"] else 200
+    try:
+        db.session.execute(text("SELECT 1"))
+        body["db"] = "ok"
+    except Exception as e:
+        body["db"] = str(e)
+        status = 503
+    body["pool"] = db.engine.pool.status()
+    queue = current_app.extensions.get("commit_queue")
+    if queue is not None:
+        body["commit_queue"] = queue.stats()
+    return jsonify(body), status
+
+
+def init_app(app):
+    request_started.connect(stats.begin, app, weak=False)
+    request_tearing_down.connect(stats.end, app, weak=False)
+    got_request_exception.connect(stats.error, app, weak=False)
+    app.add_url_rule("/healthz", "healthz", healthz)
@@ -0,0 +1,194 @@
+"""Whole-account export and purge.
+
+Both walk the account table by table in chunks, so they stay cheap for
+accounts with millions of rows. Each chunk is its own short transaction,
+which means the SQLite lock is never held for long. The export streams
+rows straight into a zip on disk. The purge uses set-based deletes,
+children before parents.
+
+The per-user tables are read from the metadata: every table with a
+``user_id`` column, plus the yearly expense archives. A new per-user table
+is therefore covered without touching this module.
+"""
+import csv
+import io
+import json
+import os
+import shutil
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from flask import current_app
+from sqlalchemy import select, delete, literal_column, or_
+
+from ..extensions import db
+from ..models import User, UserShard
+from ..models.user import invalidate_user
+from ..sharding import DIRECTORY_TABLES, bind_user
+from .history import HOT, archive_table, archive_years
+from .statements import statement_dir
+
+# Bookkeeping that means nothing outside the app; users is written as
+# account.json and expenses (hot + archived) as one expenses.csv
+NOT_EXPORTED = frozenset({"users", "user_shards", "data_versions", "budget_states", "expenses"})
+# A .part file that has not grown for this long belongs to a dead export
+STALE_EXPORT_SECONDS = 15 * 60
+
+
+def _user_tables():
+    """Per-user tables, children before parents (a safe delete order)."""
+    tables = [archive_table(y) for y in archive_years()]
+    tables += [t for t in reversed(db.metadata.sorted_tables)
+               if "user_id" in t.c and t.name not in DIRECTORY_TABLES]
+    return tables
+
+
+def _chunks(table, where, chunk_size):
+    """Yield lists of rows in rowid order, ending the read between chunks."""
+    rowid = literal_column("rowid").label("_rowid")
+    last = 0
+    while True:
+        rows = db.session.execute(
+            select(rowid, *table.c).where(where, literal_column("rowid") > last)
+            .order_by(literal_column("rowid")).limit(chunk_size)
+        ).all()
+        db.session.commit()
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield [tuple(r[1:]) for r in rows]
+
+
+def export_dir(user_id):
+    base = current_app.config.get("EXPORT_DIR") or os.path.join(current_app.instance_path, "exports")
+    return Path(base) / str(user_id)
+
+
+def list_exports(user_id):
+    """Finished export files of a user, newest first."""
+    path = export_dir(user_id)
+    return sorted(path.glob("*.zip"), reverse=True) if path.exists() else []
+
+
+def export_in_progress(user_id):
+    path = export_dir(user_id)
+    if not path.exists():
+        return False
+    now = time.time()
+    return any(now - p.stat().st_mtime < STALE_EXPORT_SECONDS for p in path.glob("*.part"))
+
+
+@contextmanager
+def _csv_member(zf, name):
+    """csv writer streaming into a new zip member."""
+    with io.TextIOWrapper(zf.open(name, "w", force_zip64=True), encoding="utf-8", newline="") as fh:
+        yield csv.writer(fh)
+
+
+def export_account(user_id, chunk_size=5000):
+    """Write every row of the account to a zip of CSV files plus account.json.
+
+    Expenses from the hot table and all archive years go to one
+    ``expenses.csv`` with an ``archived`` column. Shared default categories
+    are included in ``categories.csv`` since rows refer to them by id. The
+    zip is built as ``.part`` and renamed when complete, replacing the
+    user's previous export. Returns the path of the new file.
+    """
+    bind_user(user_id)
+    user = db.session.get(User, user_id)
+    if user is None:
+        raise ValueError(f"no user {user_id}")
+    profile = {"id": user.id, "name": user.name, "email": user.email,
+               "created_at": user.created_at.isoformat() if user.created_at else None}
+
+    target = export_dir(user_id)
+    target.mkdir(parents=True, exist_ok=True)
+    for stale in target.glob("*.part"):
+        stale.unlink(missing_ok=True)
+    final = target / f"smartexpense-{user_id}-{datetime.utcnow():%Y%m%d-%H%M%S}.zip"
+    part = final.with_name(final.name + ".part")
+    counts = {}
+    try:
+        with zipfile.ZipFile(part, "w", zipfile.ZIP_DEFLATED) as zf:
+            with _csv_member(zf, "expenses.csv") as writer:
+                writer.writerow([c.name for c in HOT.c] + ["archived"])
+                n = 0
+                for table, archived in [(HOT, False)] + [(archive_table(y), True) for y in archive_years()]:
+                    for rows in _chunks(table, table.c.user_id == user_id, chunk_size):
+                        writer.writerows(r + (archived,) for r in rows)
+                        n += len(rows)
+                counts["expenses"] = n
+
+            for table in db.metadata.sorted_tables:
+                if "user_id" not in table.c or table.name in NOT_EXPORTED:
+                    continue
+                where = table.c.user_id == user_id
+                if table.name == "categories":
+                    where = or_(where, table.c.user_id.is_(None))
+                with _csv_member(zf, f"{table.name}.csv") as writer:
+                    writer.writerow([c.name for c in table.c])
+                    n = 0
+                    for rows in _chunks(table, where, chunk_size):
+                        writer.writerows(rows)
+                        n += len(rows)
+                    counts[table.name] = n
+
+            profile["exported_at"] = datetime.utcnow().isoformat()
+            profile["rows"] = counts
+            zf.writestr("account.json", json.dumps(profile, indent=2))
+        os.replace(part, final)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    for old in target.glob("*.zip"):
+        if old != final:
+            old.unlink(missing_ok=True)
+    return final
+
+
+def _delete_chunked(table, user_id, chunk_size):
+    rowid = literal_column("rowid")
+    stmt = delete(table).where(rowid.in_(
+        select(rowid).select_from(table).where(table.c.user_id == user_id).limit(chunk_size)
+    ))
+    deleted = 0
+    while True:
+        n = db.session.execute(stmt).rowcount
+        db.session.commit()
+        deleted += n
+        if n < chunk_size:
+            return deleted
+
+
+def purge_account(user_id, chunk_size=5000):
+    """Delete a user and everything they own; returns {table: rows deleted}.
+
+    The ``users`` row goes first. ``load_user`` checks it on every request
+    in every process, so existing sessions are logged out before any data
+    goes. Every table is then emptied for the user with ``chunk_size``-row
+    deletes, each committed on its own, and swept once more to catch writes
+    from requests that were already past the login check. Cached statements
+    and exports on disk are removed too. Safe to re-run after an
+    interruption.
+    """
+    bind_user(user_id)
+    deleted = {"users": db.session.execute(delete(User).where(User.id == user_id)).rowcount}
+    db.session.commit()
+    invalidate_user(user_id)
+
+    def sweep():
+        for table in _user_tables():
+            deleted[table.name] = deleted.get(table.name, 0) + _delete_chunked(table, user_id, chunk_size)
+
+    sweep()
+    for path in (statement_dir(user_id), export_dir(user_id)):
+        shutil.rmtree(path, ignore_errors=True)
+    sweep()
+
+    # Last, since it routes the sweeps above to the user's shard
+    db.session.execute(delete(UserShard).where(UserShard.user_id == user_id))
+    db.session.commit()
+    return deleted
@@ -0,0 +1,352 @@
+"""Budget evaluation engine.
+
+Every budget scope has a row in ``budget_states`` with its running total,
+its limit and a precomputed "near" threshold (``BUDGET_NEAR_RATIO`` of the
+limit). A scope is a user's month as a whole, or one expense category in
+that month.
+
+A flush hook turns each expense or budget write into increments of the
+affected rows, at most two per expense. Only those rows are re-evaluated,
+so keeping budgets current costs O(1) per write. Pages read a row instead
+of aggregating expenses. Whenever a scope moves into or out of ``near`` /
+``over``, a row is added to ``budget_alerts`` for the UI.
+
+Core bulk writes (recurring posts, imports) bypass the hook and call
+:func:`rebuild_months` afterwards. ``flask budgets rebuild`` recomputes
+everything.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import (event, select, update, insert, func, case, literal, and_, or_, union, false,
+                        inspect as sa_inspect)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models import Expense, Category, Budget, BudgetCategory, BudgetState, BudgetAlert
+from ..models.budget_state import MONTH_SCOPE
+from .dates import month_bounds
+from .history import HOT, expenses_source, archive_table, archive_years
+
+STATES = BudgetState.__table__
+ALERTS = BudgetAlert.__table__
+KINDS = ("expense", "income", "savings")
+WARN = ("near", "over")
+PK = ["user_id", "month", "category_id"]
+
+
+def near_ratio():
+    return current_app.config.get("BUDGET_NEAR_RATIO", 0.9) if has_app_context() else 0.9
+
+
+def status_for(spent, limit_amount, near_at):
+    """The one rule for a scope's status: none, ok, near or over."""
+    if limit_amount is None:
+        return "none"
+    if spent > limit_amount:
+        return "over"
+    if near_at is not None and spent >= near_at:
+        return "near"
+    return "ok"
+
+
+def _status_expr():
+    # SQL twin of status_for()
+    return case(
+        (STATES.c.limit_amount.is_(None), "none"),
+        (STATES.c.spent > STATES.c.limit_amount, "over"),
+        (STATES.c.spent >= STATES.c.near_at, "near"),
+        else_="ok",
+    )
+
+
+def _is_key(user_id, month, category_id):
+    return and_(STATES.c.user_id == user_id, STATES.c.month == month, STATES.c.category_id == category_id)
+
+
+def _evaluate(session, where):
+    """Store the status of matching states; returns the number of alerts recorded."""
+    new = _status_expr()
+    changed = and_(where, new != STATES.c.status)
+    crossed = and_(changed, or_(new.in_(WARN), STATES.c.status.in_(WARN)))
+    alerts = session.execute(insert(ALERTS).from_select(
+        ["user_id", "month", "category_id", "status", "previous", "spent", "limit_amount", "created_at", "seen"],
+        select(STATES.c.user_id, STATES.c.month, STATES.c.category_id, new, STATES.c.status, STATES.c.spent,
+               STATES.c.limit_amount, literal(datetime.utcnow()), false()).where(crossed),
+    )).rowcount
+    session.execute(update(STATES).where(changed).values(status=new))
+    return alerts
+
+
+def _rebuild(session, user_ids, months=None):
+    """Recompute the states of ``user_ids`` (in ``months``) from the data."""
+    def scoped(user_col, month_col):
+        cond = user_col.in_(user_ids)
+        return and_(cond, month_col.in_(months)) if months else cond
+
+    start = end = None
+    if months:
+        bounds = [month_bounds(m) for m in months]
+        start, end = min(b[0] for b in bounds), max(b[1] for b in bounds)
+    src = expenses_source(list(user_ids), start, end)
+    month_expr = func.strftime('%Y-%m', src.c.spent_on)
+    in_scope = scoped(src.c.user_id, month_expr)
+    states_in_scope = scoped(STATES.c.user_id, STATES.c.month)
+
+    session.execute(update(STATES).where(states_in_scope).values(spent=0.0, income=0.0, savings=0.0))
+
+    per_category = sqlite_insert(STATES).from_select(
+        ["user_id", "month", "category_id", "spent"],
+        select(src.c.user_id, month_expr, src.c.category_id, func.sum(src.c.amount))
+        .join(Category, src.c.category_id == Category.id)
+        .where(in_scope, Category.type == "expense")
+        .group_by(src.c.user_id, month_expr, src.c.category_id),
+    )
+    session.execute(per_category.on_conflict_do_update(
+        index_elements=PK, set_={"spent": per_category.excluded.spent}))
+
+    def total(kind):
+        return func.sum(case((Category.type == kind, src.c.amount), else_=0.0))
+
+    per_month = sqlite_insert(STATES).from_select(
+        ["user_id", "month", "category_id", "spent", "income", "savings"],
+        select(src.c.user_id, month_expr, literal(MONTH_SCOPE), total("expense"), total("income"), total("savings"))
+        .join(Category, src.c.category_id == Category.id)
+        .where(in_scope)
+        .group_by(src.c.user_id, month_expr),
+    )
+    session.execute(per_month.on_conflict_do_update(index_elements=PK, set_={
+        "spent": per_month.excluded.spent,
+        "income": per_month.excluded.income,
+        "savings": per_month.excluded.savings,
+    }))
+
+    # Scopes that have a limit but no spending yet
+    session.execute(sqlite_insert(STATES).from_select(
+        PK, select(Budget.user_id, Budget.month, literal(MONTH_SCOPE)).where(scoped(Budget.user_id, Budget.month))
+    ).on_conflict_do_nothing())
+    session.execute(sqlite_insert(STATES).from_select(
+        PK, select(BudgetCategory.user_id, BudgetCategory.month, BudgetCategory.category_id)
+        .where(scoped(BudgetCategory.user_id, BudgetCategory.month))
+    ).on_conflict_do_nothing())
+
+    month_limit = select(Budget.limit_amount).where(
+        Budget.user_id == STATES.c.user_id, Budget.month == STATES.c.month).scalar_subquery()
+    category_limit = select(BudgetCategory.limit_amount).where(
+        BudgetCategory.user_id == STATES.c.user_id, BudgetCategory.month == STATES.c.month,
+        BudgetCategory.category_id == STATES.c.category_id).scalar_subquery()
+    session.execute(update(STATES).where(states_in_scope).values(
+        limit_amount=case((STATES.c.category_id == MONTH_SCOPE, month_limit), else_=category_limit)))
+    session.execute(update(STATES).where(states_in_scope).values(near_at=STATES.c.limit_amount * near_ratio()))
+    return _evaluate(session, states_in_scope)
+
+
+def _ensure_months(session, keys):
+    """Build the states of every (user, month) in ``keys`` that has none yet."""
+    keys = {(u, m) for u, m in keys if u is not None and m}
+    if not keys:
+        return
+    have = set(session.execute(
+        select(STATES.c.user_id, STATES.c.month).where(
+            STATES.c.category_id == MONTH_SCOPE,
+            or_(*(and_(STATES.c.user_id == u, STATES.c.month == m) for u, m in keys)),
+        )
+    ).all())
+    for user_id, month in keys - have:
+        _rebuild(session, [user_id], [month])
+        session.execute(sqlite_insert(STATES).values(
+            user_id=user_id, month=month, category_id=MONTH_SCOPE).on_conflict_do_nothing())
+
+
+def _apply(session, deltas, limits):
+    _ensure_months(session, {(u, m) for u, m, _ in list(deltas) + list(limits)})
+    for (user_id, month, category_id), (spent, income, savings) in deltas.items():
+        if category_id != MONTH_SCOPE:
+            session.execute(sqlite_insert(STATES).values(
+                user_id=user_id, month=month, category_id=category_id).on_conflict_do_nothing())
+        session.execute(update(STATES).where(_is_key(user_id, month, category_id)).values(
+            spent=STATES.c.spent + spent, income=STATES.c.income + income, savings=STATES.c.savings + savings))
+    ratio = near_ratio()
+    for (user_id, month, category_id), limit_amount in limits.items():
+        session.execute(sqlite_insert(STATES).values(
+            user_id=user_id, month=month, category_id=category_id).on_conflict_do_nothing())
+        session.execute(update(STATES).where(_is_key(user_id, month, category_id)).values(
+            limit_amount=limit_amount, near_at=None if limit_amount is None else limit_amount * ratio))
+    keys = list(set(deltas) | set(limits))
+    for i in range(0, len(keys), 200):
+        _evaluate(session, or_(*(_is_key(*k) for k in keys[i:i + 200])))
+
+
+def _previous(obj, attr):
+    hist = sa_inspect(obj).attrs[attr].history
+    return hist.deleted[0] if hist.deleted else getattr(obj, attr)
+
+
+def _budget_key(user_id, month, category_id=None):
+    return (user_id, month, MONTH_SCOPE if category_id is None else int(category_id))
+
+
+@event.listens_for(Session, "before_flush")
+def _track_writes(session, flush_context, instances):
+    deltas = defaultdict(lambda: [0.0, 0.0, 0.0])
+    limits = {}
+    kinds = {}
+
+    def add_expense(user_id, category_id, amount, spent_on, sign):
+        if user_id is None or category_id is None or not amount:
+            return
+        category_id = int(category_id)
+        if category_id not in kinds:
+            kinds[category_id] = session.execute(
+                select(Category.type).where(Category.id == category_id)).scalar()
+        kind = kinds[category_id]
+        if kind not in KINDS:
+            return
+        month = (spent_on or date.today()).strftime("%Y-%m")
+        amount = sign * float(amount)
+        deltas[(user_id, month, MONTH_SCOPE)][KINDS.index(kind)] += amount
+        if kind == "expense":
+            deltas[(user_id, month, category_id)][0] += amount
+
+    def expense_now(obj, sign):
+        add_expense(obj.user_id, obj.category_id, obj.amount, obj.spent_on, sign)
+
+    def expense_before(obj, sign):
+        add_expense(*(_previous(obj, a) for a in ("user_id", "category_id", "amount", "spent_on")), sign)
+
+    def budget_key(obj, get=getattr):
+        category_id = get(obj, "category_id") if isinstance(obj, BudgetCategory) else None
+        return _budget_key(get(obj, "user_id"), get(obj, "month"), category_id)
+
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, Expense):
+                expense_now(obj, 1)
+            elif isinstance(obj, (Budget, BudgetCategory)):
+                limits[budget_key(obj)] = obj.limit_amount
+        for obj in session.deleted:
+            if isinstance(obj, Expense):
+                expense_before(obj, -1)
+            elif isinstance(obj, (Budget, BudgetCategory)):
+                limits[budget_key(obj, _previous)] = None
+        for obj in session.dirty:
+            if not isinstance(obj, (Expense, Budget, BudgetCategory)):
+                continue
+            if not session.is_modified(obj, include_collections=False):
+                continue
+            if isinstance(obj, Expense):
+                expense_before(obj, -1)
+                expense_now(obj, 1)
+            else:
+                old, new = budget_key(obj, _previous), budget_key(obj)
+                if old != new:
+                    limits[old] = None
+                limits[new] = obj.limit_amount
+        if deltas or limits:
+            _apply(session, deltas, limits)
+
+
+def _read_state(user_id, month, category_id=MONTH_SCOPE):
+    return db.session.execute(select(STATES).where(_is_key(user_id, month, category_id))).first()
+
+
+def month_state(user_id, month):
+    """State row of a whole month (spent/income/savings, limit, status).
+
+    States missing for older data are built on first use; read-only routes
+    should commit afterwards so that happens only once.
+    """
+    db.session.flush()  # pending expenses of this unit of work count too
+    _ensure_months(db.session, {(user_id, month)})
+    return _read_state(user_id, month)
+
+
+def month_states(user_id, months):
+    """{month: month state row} for several months, built on first use."""
+    months = set(months)
+    if not months:
+        return {}
+    db.session.flush()
+    _ensure_months(db.session, {(user_id, m) for m in months})
+    rows = db.session.execute(select(STATES).where(
+        STATES.c.user_id == user_id, STATES.c.month.in_(months), STATES.c.category_id == MONTH_SCOPE))
+    return {r.month: r for r in rows}
+
+
+def category_states(user_id, month):
+    """{category_id: state row} of the expense categories in a month."""
+    db.session.flush()
+    _ensure_months(db.session, {(user_id, month)})
+    rows = db.session.execute(select(STATES).where(
+        STATES.c.user_id == user_id, STATES.c.month == month, STATES.c.category_id != MONTH_SCOPE))
+    return {r.category_id: r for r in rows}
+
+
+def check_expense(user_id, amount, category_id=None, date_obj=None):
+    """Why adding this expense would break the balance or a budget, or None."""
+    month = (date_obj or date.today()).strftime("%Y-%m")
+    m = month_state(user_id, month)
+
+    remaining_balance = m.income - m.spent - m.savings
+    if amount > remaining_balance:
+        return f"Amount exceeds available balance. Remaining: ₹{remaining_balance:.2f}"
+
+    if category_id:
+        c = _read_state(user_id, month, int(category_id))
+        if c is not None and c.limit_amount is not None and c.spent + amount > c.limit_amount:
+            return ("Adding this expense would exceed your budget for this category. "
+                    f"Remaining: ₹{c.limit_amount - c.spent:.2f}")
+
+    if m.limit_amount is not None and m.spent + amount > m.limit_amount:
+        return f"Adding this expense would exceed your monthly budget. Remaining: ₹{m.limit_amount - m.spent:.2f}"
+    return None
+
+
+def unseen_alerts(user_id, limit=5):
+    return (BudgetAlert.query.filter_by(user_id=user_id, seen=False)
+            .order_by(BudgetAlert.id.desc()).limit(limit).all())
+
+
+def mark_alerts_seen(user_id, alert_ids):
+    """Mark the given alerts seen; ids not belonging to the user are ignored."""
+    if not alert_ids:
+        return
+    db.session.execute(update(ALERTS).where(ALERTS.c.user_id == user_id, ALERTS.c.id.in_(alert_ids))
+                       .values(seen=True))
+
+
+def rebuild_months(keys, batch_users=500):
+    """Recompute the states of the (user, month) pairs touched by a bulk write."""
+    keys = {(u, m) for u, m in keys if u is not None and m}
+    if not keys:
+        return 0
+    users = sorted({u for u, _ in keys})
+    months = sorted({m for _, m in keys})
+    alerts = 0
+    for i in range(0, len(users), batch_users):
+        alerts += _rebuild(db.session, users[i:i + batch_users], months)
+    return alerts
+
+
+def rebuild(user_id=None, month=None, batch_users=500):
+    """Batch mode: recompute every budget state from the data.
+
+    For use after bulk imports or anything else that wrote expenses or
+    budgets behind the ORM's back. Users are processed ``batch_users`` at a
+    time, one transaction each. Returns (users, alerts recorded).
+    """
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        parts = [select(HOT.c.user_id), select(Budget.user_id), select(BudgetCategory.user_id),
+                 select(STATES.c.user_id)]
+        parts += [select(archive_table(y).c.user_id) for y in archive_years()]
+        user_ids = sorted(u for u in db.session.execute(union(*parts)).scalars() if u is not None)
+    months = [month] if month else None
+    alerts = 0
+    for i in range(0, len(user_ids), batch_users):
+        alerts += _rebuild(db.session, user_ids[i:i + batch_users], months)
+        db.session.commit()
+    return len(user_ids), alerts
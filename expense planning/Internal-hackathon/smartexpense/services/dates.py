@@ -0,0 +1,17 @@
+import calendar
+from datetime import date
+
+
+def add_months(d, n):
+    """``d`` shifted by ``n`` months, clamped to the end of short months."""
+    month0 = d.month - 1 + n
+    year = d.year + month0 // 12
+    month = month0 % 12 + 1
+    day = min(d.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def month_bounds(month):
+    """[first day, first day of next month) for a 'YYYY-MM' string."""
+    first = date.fromisoformat(f"{month}-01")
+    return first, add_months(first, 1)
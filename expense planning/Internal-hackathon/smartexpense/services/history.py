@@ -0,0 +1,188 @@
+"""Hot/cold storage for expenses.
+
+Recent months live in the ``expenses`` table that every page writes to and
+aggregates over. Closed months older than ``ARCHIVE_HORIZON_MONTHS`` are moved
+into one ``expenses_archive_<year>`` table per year, with per-category monthly
+totals kept in ``expense_monthly_summaries``. Anything that needs the whole
+history (listing, export, statements, trends) reads through
+:func:`expenses_source` instead of ``Expense`` directly.
+"""
+from datetime import date
+
+from flask import current_app
+from sqlalchemy import (MetaData, Table, Column, Index, select, union_all, func, delete,
+                        inspect as sa_inspect, false, true)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..extensions import db
+from ..models import Expense, Category, ExpenseMonthlySummary
+from .dates import add_months
+
+HOT = Expense.__table__
+ARCHIVE_PREFIX = "expenses_archive_"
+COLUMNS = ("id", "user_id", "title", "category_id", "amount", "payment_mode", "spent_on", "note")
+
+# Archive tables are created on demand, so they live outside db.metadata and
+# are never touched by create_all().
+_archive_metadata = MetaData()
+
+
+def archive_table(year):
+    name = f"{ARCHIVE_PREFIX}{year}"
+    if name in _archive_metadata.tables:
+        return _archive_metadata.tables[name]
+    # No primary key: SQLite may hand an archived row's id to a new hot row, so
+    # the same id can legitimately reach one archive table twice.
+    return Table(
+        name, _archive_metadata,
+        *(Column(c.name, c.type) for c in HOT.columns),
+        Index(f"ix_{name}_user_spent_on", "user_id", "spent_on"),
+    )
+
+
+def archive_years(bind=None):
+    """Years that have an archive table, oldest first."""
+    names = sa_inspect(bind if bind is not None else db.session.connection()).get_table_names()
+    years = []
+    for n in names:
+        if n.startswith(ARCHIVE_PREFIX) and n[len(ARCHIVE_PREFIX):].isdigit():
+            years.append(int(n[len(ARCHIVE_PREFIX):]))
+    return sorted(years)
+
+
+def expenses_source(user_id=None, start=None, end=None):
+    """Subquery over hot and archived expenses with an ``archived`` flag.
+
+    Filters are applied inside each branch so every table uses its own
+    (user_id, spent_on) index, and archive years outside [start, end) are
+    not scanned at all. ``user_id`` may also be a collection of ids.
+    """
+    def branch(table, archived):
+        q = select(*(table.c[c] for c in COLUMNS), (true() if archived else false()).label("archived"))
+        if isinstance(user_id, (list, tuple, set, frozenset)):
+            q = q.where(table.c.user_id.in_(user_id))
+        elif user_id is not None:
+            q = q.where(table.c.user_id == user_id)
+        if start is not None:
+            q = q.where(table.c.spent_on >= start)
+        if end is not None:
+            q = q.where(table.c.spent_on < end)
+        return q
+
+    parts = [branch(HOT, False)]
+    for year in archive_years():
+        if start is not None and year < start.year:
+            continue
+        if end is not None and date(year, 1, 1) >= end:
+            continue
+        parts.append(branch(archive_table(year), True))
+    stmt = parts[0] if len(parts) == 1 else union_all(*parts)
+    return stmt.subquery("all_expenses")
+
+
+def expense_rows(user_id, start=None, end=None):
+    """Select of full-history rows for listings/exports, newest first."""
+    src = expenses_source(user_id, start, end)
+    return (
+        select(src, Category.name.label("category_name"), Category.type.label("category_type"))
+        .outerjoin(Category, src.c.category_id == Category.id)
+        .order_by(src.c.spent_on.desc(), src.c.id.desc())
+    )
+
+
+def category_in_use(user_id, category_id):
+    src = expenses_source(user_id)
+    q = select(src.c.id).where(src.c.category_id == category_id).limit(1)
+    return db.session.execute(q).first() is not None
+
+
+def monthly_totals(user_id, kind="expense", months=12, today=None):
+    """[(YYYY-MM, total)] for the last ``months`` months, oldest first.
+
+    Archived months are answered from the summaries table; only the hot
+    table is aggregated row by row.
+    """
+    today = today or date.today()
+    first = add_months(today.replace(day=1), -(months - 1))
+    cold = (
+        select(ExpenseMonthlySummary.month.label("month"), ExpenseMonthlySummary.total.label("total"))
+        .join(Category, ExpenseMonthlySummary.category_id == Category.id)
+        .where(ExpenseMonthlySummary.user_id == user_id, Category.type == kind,
+               ExpenseMonthlySummary.month >= first.strftime("%Y-%m"))
+    )
+    hot = (
+        select(func.strftime('%Y-%m', Expense.spent_on).label("month"), Expense.amount.label("total"))
+        .join(Category, Expense.category_id == Category.id)
+        .where(Expense.user_id == user_id, Category.type == kind, Expense.spent_on >= first)
+    )
+    both = union_all(cold, hot).subquery()
+    rows = dict(db.session.execute(
+        select(both.c.month, func.sum(both.c.total)).group_by(both.c.month)
+    ).all())
+    out = []
+    for i in range(months):
+        m = add_months(first, i).strftime("%Y-%m")
+        out.append((m, float(rows.get(m) or 0.0)))
+    return out
+
+
+def archive_cutoff(today=None, horizon_months=None):
+    """First day of the oldest month that stays in the hot table."""
+    today = today or date.today()
+    if horizon_months is None:
+        horizon_months = current_app.config.get("ARCHIVE_HORIZON_MONTHS", 12)
+    return add_months(today.replace(day=1), -horizon_months)
+
+
+def archive_closed_months(today=None, horizon_months=None, chunk_size=5000):
+    """Move expenses older than the horizon out of the hot table.
+
+    Works in chunks of ``chunk_size`` rows, each in its own short transaction:
+    fold the rows into the monthly summaries, copy them into their year's
+    archive table, then delete them from ``expenses``. Rows that show up later
+    with an old date are picked up by the next run and added to the summaries.
+
+    Returns the number of rows archived.
+    """
+    cutoff = archive_cutoff(today, horizon_months)
+    month_expr = func.strftime('%Y-%m', HOT.c.spent_on)
+    moved = 0
+    while True:
+        ids = db.session.execute(
+            select(HOT.c.id).where(HOT.c.spent_on < cutoff).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            break
+        conn = db.session.connection()
+
+        summary = sqlite_insert(ExpenseMonthlySummary).from_select(
+            ["user_id", "month", "category_id", "total", "count"],
+            select(HOT.c.user_id, month_expr, HOT.c.category_id, func.sum(HOT.c.amount), func.count())
+            .where(HOT.c.id.in_(ids))
+            .group_by(HOT.c.user_id, month_expr, HOT.c.category_id),
+        )
+        summary = summary.on_conflict_do_update(
+            index_elements=["user_id", "month", "category_id"],
+            set_={
+                "total": ExpenseMonthlySummary.total + summary.excluded.total,
+                "count": ExpenseMonthlySummary.count + summary.excluded["count"],
+            },
+        )
+        conn.execute(summary)
+
+        years = conn.execute(
+            select(func.strftime('%Y', HOT.c.spent_on)).where(HOT.c.id.in_(ids)).distinct()
+        ).scalars().all()
+        for y in years:
+            table = archive_table(int(y))
+            table.create(bind=conn, checkfirst=True)
+            conn.execute(table.insert().from_select(
+                list(COLUMNS),
+                select(*(HOT.c[c] for c in COLUMNS)).where(
+                    HOT.c.id.in_(ids), func.strftime('%Y', HOT.c.spent_on) == y
+                ),
+            ))
+        conn.execute(delete(HOT).where(HOT.c.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+    return moved
@@ -0,0 +1,113 @@
+"""Recurring transaction rules and the scheduler that materializes them."""
+from datetime import date, timedelta
+
+from sqlalchemy import insert, update, select
+
+from ..extensions import db
+from ..models import Expense, RecurringRule
+from ..models.data_version import bump_versions_bulk
+from .dates import add_months
+from .budgets import rebuild_months
+
+FREQUENCIES = ("monthly", "weekly", "custom")
+
+# Safety net for a mis-configured custom rule (e.g. interval of 1 day, started
+# decades ago): never materialize more than this many rows for one rule per run.
+MAX_OCCURRENCES_PER_RUN = 400
+# New rules may start at most this far back; older history is not backfilled
+MAX_BACKFILL_DAYS = 366
+
+
+def occurrence(frequency, interval_days, start_on, n):
+    """Date of the ``n``-th occurrence (0-based) of a rule.
+
+    Always computed from ``start_on`` so monthly rules on the 31st land on the
+    last day of short months without drifting afterwards.
+    """
+    if frequency == "monthly":
+        return add_months(start_on, n)
+    if frequency == "weekly":
+        return start_on + timedelta(weeks=n)
+    return start_on + timedelta(days=n * max(1, interval_days or 1))
+
+
+def category_has_rules(user_id, category_id):
+    """Whether any recurring rule (active or paused) posts to the category."""
+    q = select(RecurringRule.id).where(RecurringRule.user_id == user_id,
+                                       RecurringRule.category_id == category_id).limit(1)
+    return db.session.execute(q).first() is not None
+
+
+def _plan(rule, today):
+    """Expense rows due for ``rule`` up to ``today`` and its new high-water mark."""
+    rows = []
+    n = rule.run_count
+    nxt = rule.next_run_on
+    while nxt is not None and nxt <= today and len(rows) < MAX_OCCURRENCES_PER_RUN:
+        if rule.end_on and nxt > rule.end_on:
+            nxt = None
+            break
+        rows.append({
+            "user_id": rule.user_id,
+            "title": rule.title,
+            "category_id": rule.category_id,
+            "amount": rule.amount,
+            "payment_mode": rule.payment_mode,
+            "spent_on": nxt,
+            "note": rule.note,
+        })
+        n += 1
+        nxt = occurrence(rule.frequency, rule.interval_days, rule.start_on, n)
+    if nxt is not None and rule.end_on and nxt > rule.end_on:
+        nxt = None
+    return rows, {"id": rule.id, "run_count": n, "next_run_on": nxt}
+
+
+def materialize_due(today=None, batch_size=5000, user_id=None, only_today=False):
+    """Insert every due occurrence of every active rule, batch by batch.
+
+    Each batch is one transaction holding the expense inserts, the rules'
+    advanced high-water marks and the budget-state refresh, so a crashed or repeated
+    run never double-posts. Batches page on the rule id, so each rule is
+    handled once per run and a rule that hits ``MAX_OCCURRENCES_PER_RUN``
+    continues on the next run. ``only_today`` skips rules with older
+    occurrences still due and leaves that backfill to the scheduler.
+
+    Returns (rules_processed, expenses_created).
+    """
+    today = today or date.today()
+    cols = (RecurringRule.id, RecurringRule.user_id, RecurringRule.category_id, RecurringRule.title,
+            RecurringRule.amount, RecurringRule.payment_mode, RecurringRule.note, RecurringRule.frequency,
+            RecurringRule.interval_days, RecurringRule.start_on, RecurringRule.end_on,
+            RecurringRule.next_run_on, RecurringRule.run_count)
+    processed = created = 0
+    last_id = 0
+    while True:
+        q = select(*cols).where(RecurringRule.next_run_on <= today, RecurringRule.active.is_(True),
+                                RecurringRule.id > last_id)
+        if user_id is not None:
+            q = q.where(RecurringRule.user_id == user_id)
+        if only_today:
+            q = q.where(RecurringRule.next_run_on == today)
+        rules = db.session.execute(q.order_by(RecurringRule.id).limit(batch_size)).all()
+        if not rules:
+            break
+        last_id = rules[-1].id
+
+        expense_rows, marks = [], []
+        for rule in rules:
+            rows, mark = _plan(rule, today)
+            expense_rows.extend(rows)
+            marks.append(mark)
+
+        if expense_rows:
+            db.session.execute(insert(Expense), expense_rows)
+        db.session.execute(update(RecurringRule), marks)
+        keys = {(r["user_id"], r["spent_on"].strftime("%Y-%m")) for r in expense_rows}
+        rebuild_months(keys)
+        bump_versions_bulk(db.session, keys)
+        db.session.commit()
+
+        processed += len(rules)
+        created += len(expense_rows)
+    return processed, created
@@ -0,0 +1,294 @@
+"""Monthly PDF statements rendered with reportlab and cached on disk."""
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from flask import current_app
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+from sqlalchemy import func, select, or_
+
+from ..extensions import db
+from ..sharding import bind_user
+from ..models import Category, BudgetCategory, User
+from ..models.data_version import current_version
+from .dates import month_bounds
+from .history import expenses_source
+
+PAGE_W, PAGE_H = A4
+MARGIN = 18 * mm
+LINE = 5.5 * mm
+ROW_BATCH = 500
+
+
+def _cache_dir():
+    path = current_app.config.get("STATEMENT_CACHE_DIR") or os.path.join(current_app.instance_path, "statements")
+    return Path(path)
+
+
+def statement_dir(user_id):
+    return _cache_dir() / str(user_id)
+
+
+def _labels_digest(user_id):
+    """Digest of the profile and category names a statement prints.
+
+    Renaming a category or editing the profile does not bump any month's
+    data version, so these go into the cache key separately.
+    """
+    user = db.session.get(User, user_id)
+    categories = db.session.execute(
+        select(Category.id, Category.name, Category.type)
+        .where(or_(Category.user_id == user_id, Category.user_id.is_(None)))
+        .order_by(Category.id)
+    ).all()
+    labels = ((user.name, user.email) if user else None, [tuple(c) for c in categories])
+    return hashlib.blake2b(repr(labels).encode(), digest_size=6).hexdigest()
+
+
+def statement_path(user_id, month):
+    """Cache location for a statement; the data version and labels are the key."""
+    version = current_version(user_id, month)
+    return statement_dir(user_id) / f"{month}-v{version}-{_labels_digest(user_id)}.pdf"
+
+
+def get_statement(user_id, month):
+    """Return the path of an up-to-date statement, rendering it if needed."""
+    path = statement_path(user_id, month)
+    if not path.exists():
+        render_statement(user_id, month, path)
+    return path
+
+
+def _source(user_id, month):
+    # Archived months are read from their archive table transparently
+    first, nxt = month_bounds(month)
+    return expenses_source(user_id, first, nxt)
+
+
+def _totals_by_kind(user_id, month):
+    src = _source(user_id, month)
+    rows = db.session.execute(
+        select(Category.type, func.coalesce(func.sum(src.c.amount), 0.0))
+        .join(Category, src.c.category_id == Category.id)
+        .group_by(Category.type)
+    ).all()
+    totals = {"expense": 0.0, "income": 0.0, "savings": 0.0}
+    totals.update({kind: float(total) for kind, total in rows if kind})
+    return totals
+
+
+def _category_breakdown(user_id, month):
+    src = _source(user_id, month)
+    spent = dict(db.session.execute(
+        select(src.c.category_id, func.sum(src.c.amount))
+        .join(Category, src.c.category_id == Category.id)
+        .where(Category.type == 'expense')
+        .group_by(src.c.category_id)
+    ).all())
+    limits = dict(
+        db.session.query(BudgetCategory.category_id, BudgetCategory.limit_amount)
+        .filter(BudgetCategory.user_id == user_id, BudgetCategory.month == month)
+        .all()
+    )
+    ids = set(spent) | set(limits)
+    if not ids:
+        return []
+    names = dict(db.session.query(Category.id, Category.name).filter(Category.id.in_(ids)).all())
+    rows = []
+    for cid in sorted(ids, key=lambda i: (names.get(i) or "").lower()):
+        rows.append({
+            "name": names.get(cid, "?"),
+            "spent": float(spent.get(cid) or 0.0),
+            "limit": limits.get(cid),
+        })
+    return rows
+
+
+def _transactions(user_id, month):
+    """Yield transaction rows in date order without materializing the month."""
+    src = _source(user_id, month)
+    q = (
+        select(src.c.spent_on, src.c.title, Category.name, Category.type, src.c.payment_mode, src.c.amount)
+        .outerjoin(Category, src.c.category_id == Category.id)
+        .order_by(src.c.spent_on, src.c.id)
+        .execution_options(yield_per=ROW_BATCH)
+    )
+    yield from db.session.execute(q)
+
+
+class _Writer:
+    """Tiny line-oriented layer over a reportlab canvas with page breaks."""
+
+    def __init__(self, path, title):
+        self.c = canvas.Canvas(str(path), pagesize=A4)
+        self.c.setTitle(title)
+        self.y = PAGE_H - MARGIN
+        self.page_header = None
+
+    def ensure(self, lines=1):
+        if self.y - lines * LINE < MARGIN:
+            self.c.showPage()
+            self.y = PAGE_H - MARGIN
+            if self.page_header:
+                self.page_header()
+
+    def text(self, x, s, font="Helvetica", size=9, right=False):
+        self.c.setFont(font, size)
+        if right:
+            self.c.drawRightString(x, self.y, s)
+        else:
+            self.c.drawString(x, self.y, s)
+
+    def newline(self, n=1):
+        self.y -= n * LINE
+
+    def save(self):
+        self.c.showPage()
+        self.c.save()
+
+
+def _money(v):
+    return f"Rs. {v:,.2f}"
+
+
+def render_statement(user_id, month, path):
+    """Render the statement for ``user_id`` and ``month`` into ``path``.
+
+    Transactions are drawn straight from a server-side cursor so memory use
+    does not depend on how many rows the month has. The file is written to a
+    temp name and moved into place so readers never see a partial PDF.
+    """
+    user = db.session.get(User, user_id)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    right = PAGE_W - MARGIN
+    try:
+        w = _Writer(tmp, f"SmartExpense statement {month}")
+        w.text(MARGIN, "SmartExpense - Monthly Statement", "Helvetica-Bold", 14)
+        w.newline(1.5)
+        w.text(MARGIN, f"{user.name if user else user_id}  <{user.email if user else ''}>   Month: {month}", size=10)
+        w.newline(2)
+
+        totals = _totals_by_kind(user_id, month)
+        w.text(MARGIN, "Totals", "Helvetica-Bold", 11)
+        w.newline()
+        for label, key in (("Income", "income"), ("Expenses", "expense"), ("Savings", "savings")):
+            w.text(MARGIN, label)
+            w.text(right, _money(totals[key]), right=True)
+            w.newline()
+        w.text(MARGIN, "Balance", "Helvetica-Bold")
+        w.text(right, _money(totals["income"] - totals["expense"] - totals["savings"]), "Helvetica-Bold", right=True)
+        w.newline(2)
+
+        w.ensure(3)
+        w.text(MARGIN, "Category budgets", "Helvetica-Bold", 11)
+        w.newline()
+        w.text(MARGIN, "Category", "Helvetica-Bold")
+        w.text(right - 70 * mm, "Budget", "Helvetica-Bold", right=True)
+        w.text(right - 35 * mm, "Actual", "Helvetica-Bold", right=True)
+        w.text(right, "Remaining", "Helvetica-Bold", right=True)
+        w.newline()
+        breakdown = _category_breakdown(user_id, month)
+        if not breakdown:
+            w.text(MARGIN, "No expenses recorded this month.")
+            w.newline()
+        for row in breakdown:
+            w.ensure()
+            w.text(MARGIN, row["name"][:50])
+            if row["limit"] is not None:
+                w.text(right - 70 * mm, _money(row["limit"]), right=True)
+                w.text(right, _money(row["limit"] - row["spent"]), right=True)
+            else:
+                w.text(right - 70 * mm, "-", right=True)
+                w.text(right, "-", right=True)
+            w.text(right - 35 * mm, _money(row["spent"]), right=True)
+            w.newline()
+        w.newline()
+
+        def tx_header():
+            w.text(MARGIN, "Date", "Helvetica-Bold")
+            w.text(MARGIN + 25 * mm, "Title", "Helvetica-Bold")
+            w.text(MARGIN + 85 * mm, "Category", "Helvetica-Bold")
+            w.text(MARGIN + 125 * mm, "Payment", "Helvetica-Bold")
+            w.text(right, "Amount", "Helvetica-Bold", right=True)
+            w.newline()
+
+        w.ensure(3)
+        w.text(MARGIN, "Transactions", "Helvetica-Bold", 11)
+        w.newline()
+        tx_header()
+        w.page_header = tx_header
+        count = 0
+        for spent_on, title, cat_name, kind, payment_mode, amount in _transactions(user_id, month):
+            w.ensure()
+            w.text(MARGIN, spent_on.isoformat())
+            w.text(MARGIN + 25 * mm, (title or "")[:38])
+            w.text(MARGIN + 85 * mm, (cat_name or "")[:24])
+            w.text(MARGIN + 125 * mm, (payment_mode or "")[:14])
+            sign = "+" if kind == "income" else ""
+            w.text(right, sign + _money(amount or 0.0), right=True)
+            w.newline()
+            count += 1
+        if not count:
+            w.text(MARGIN, "No transactions.")
+        w.save()
+    except Exception:
+        os.unlink(tmp)
+        raise
+    os.replace(tmp, path)
+    # Older versions of the same month are stale now
+    for old in path.parent.glob(f"{month}-v*.pdf"):
+        if old != path:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+    return path
+
+
+# ---- bulk rendering -------------------------------------------------------
+
+_worker_app = None
+
+
+def _init_worker():
+    global _worker_app
+    from .. import create_app
+    # A fresh app gives each process its own engine instead of the parent's pool
+    _worker_app = create_app()
+
+
+def _render_chunk(user_ids, month):
+    rendered = 0
+    with _worker_app.app_context():
+        for uid in user_ids:
+            bind_user(uid)
+            if not statement_path(uid, month).exists():
+                get_statement(uid, month)
+                rendered += 1
+        db.session.remove()
+    return rendered
+
+
+def render_all(month, workers=None, chunk_size=50):
+    """Render statements for every user for ``month`` across processes.
+
+    Returns (users, rendered) where rendered excludes cache hits.
+    """
+    user_ids = [uid for (uid,) in db.session.query(User.id).order_by(User.id)]
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    if not chunks:
+        return 0, 0
+    workers = workers or os.cpu_count() or 1
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker) as pool:
+        futures = [pool.submit(_render_chunk, chunk, month) for chunk in chunks]
+        for fut in as_completed(futures):
+            rendered += fut.result()
+    return len(user_ids), rendered
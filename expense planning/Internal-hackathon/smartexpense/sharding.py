@@ -0,0 +1,234 @@
+"""User-sharded storage across several SQLite files.
+
+With ``SHARD_COUNT`` > 0 every table except the directory tables (``users``
+and ``user_shards``) lives in one of N shard databases. Each user is pinned
+to a shard in ``user_shards``; once a request has a logged-in user,
+``db.session`` routes all user-scoped statements to that user's shard, so
+the blueprints keep querying by ``current_user.id`` exactly as before. Each
+shard is its own file with its own write lock, so writes from users on
+different shards no longer queue behind each other.
+
+With ``SHARD_COUNT`` = 0 (the default) nothing changes: there is one
+database and the directory lookups are skipped.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.util import find_tables
+
+DIRECTORY_TABLES = frozenset({"users", "user_shards"})
+
+
+class ShardedSession(Session):
+    """Session that sends user-scoped tables to the bound shard's engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = self.info.get("shard")
+        if bind is None and shard is not None and has_app_context():
+            router = current_app.extensions.get("shards")
+            if router is not None and _is_user_scoped(mapper, clause):
+                return router.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_user_scoped(mapper, clause):
+    names = set()
+    if mapper is not None:
+        names.add(sa.inspect(mapper).local_table.name)
+    if clause is not None:
+        if isinstance(clause, sa.Table):
+            names.add(clause.name)
+        else:
+            names.update(t.name for t in find_tables(clause, include_crud=True))
+    # Statements without a table (text(), bare connection()) follow the shard
+    return not names or not names <= DIRECTORY_TABLES
+
+
+class ShardRouter:
+    def __init__(self, app, count, url_template):
+        self.count = count
+        self.urls = [url_template.format(n=n, instance=app.instance_path) for n in range(count)]
+        self.engines = [sa.create_engine(url) for url in self.urls]
+        from .extensions import configure_sqlite
+        for engine in self.engines:
+            configure_sqlite(engine, app.config.get("SQLITE_JOURNAL_MODE"))
+
+    def create_tables(self):
+        from .extensions import db
+        tables = [t for t in db.metadata.sorted_tables if t.name not in DIRECTORY_TABLES]
+        for engine in self.engines:
+            db.metadata.create_all(engine, tables=tables)
+
+    def dispose(self):
+        for engine in self.engines:
+            engine.dispose(close=False)
+
+    def shard_for(self, user_id):
+        """Shard of ``user_id``, assigning ``user_id % count`` on first use."""
+        from .extensions import db
+        from .models import UserShard
+        shard = db.session.execute(
+            sa.select(UserShard.shard).where(UserShard.user_id == user_id)
+        ).scalar()
+        if shard is None:
+            # A savepoint, never a commit: the caller's pending changes must not
+            # be committed as a side effect. The row is saved with the caller's
+            # transaction; until then the same default shard is derived again.
+            shard = user_id % self.count
+            with db.session.begin_nested():
+                db.session.execute(
+                    sa.insert(UserShard).prefix_with("OR IGNORE"), {"user_id": user_id, "shard": shard}
+                )
+            shard = db.session.execute(
+                sa.select(UserShard.shard).where(UserShard.user_id == user_id)
+            ).scalar()
+        return shard
+
+
+def get_router():
+    return current_app.extensions.get("shards")
+
+
+def bind_shard(shard):
+    """Route the current session's user-scoped statements to ``shard``."""
+    from .extensions import db
+    db.session.info["shard"] = shard
+
+
+def bind_user(user_id):
+    """Route the current session to ``user_id``'s shard (no-op when unsharded)."""
+    router = get_router()
+    if router is not None:
+        bind_shard(router.shard_for(user_id))
+
+
+def fan_out(fn, parallel=True):
+    """Run ``fn(shard)`` once per shard, each in its own app context/session.
+
+    Used by admin and batch jobs that span all users. Returns the results in
+    shard order. Without sharding ``fn(None)`` runs once against the single
+    database.
+    """
+    from .extensions import db
+    app = current_app._get_current_object()
+    router = get_router()
+    if router is None:
+        return [fn(None)]
+
+    def run(shard):
+        with app.app_context():
+            bind_shard(shard)
+            try:
+                return fn(shard)
+            finally:
+                db.session.remove()
+
+    shards = range(router.count)
+    if not parallel:
+        return [run(s) for s in shards]
+    with ThreadPoolExecutor(max_workers=router.count) as pool:
+        return list(pool.map(run, shards))
+
+
+def move_user(user_id, target, chunk_size=5000):
+    """Copy all of a user's rows to shard ``target`` and repoint the directory.
+
+    Row ids are shard-local, so rows are re-inserted with fresh ids and
+    category references are remapped. The user should not be writing while
+    the move runs; the source rows are deleted only after the directory has
+    been switched.
+    """
+    from .extensions import db
+    from .models import UserShard, Category
+    from .services.history import archive_years, archive_table
+
+    router = get_router()
+    source = router.shard_for(user_id)
+    if source == target:
+        return 0
+    src, dst = router.engines[source], router.engines[target]
+    tables = [t for t in db.metadata.sorted_tables
+              if t.name not in DIRECTORY_TABLES and "user_id" in t.c]
+    copied = 0
+    with src.connect() as sconn, dst.begin() as dconn:
+        cat_map = {}
+        cats = Category.__table__
+        for row in sconn.execute(sa.select(cats).where(cats.c.user_id == user_id)).mappings():
+            data = {k: v for k, v in row.items() if k != "id"}
+            cat_map[row["id"]] = dconn.execute(sa.insert(cats).values(**data)).inserted_primary_key[0]
+            copied += 1
+
+        extra = [archive_table(y) for y in archive_years(sconn)]
+        for table in [t for t in tables if t.name != "categories"] + extra:
+            table.create(bind=dconn, checkfirst=True)
+            has_pk_id = "id" in table.c and table.c.id.primary_key
+            result = sconn.execution_options(yield_per=chunk_size).execute(
+                sa.select(table).where(table.c.user_id == user_id)
+            ).mappings()
+            for part in result.partitions():
+                rows = []
+                for row in part:
+                    data = dict(row)
+                    if has_pk_id:
+                        data.pop("id")
+                    if "category_id" in data and data["category_id"] in cat_map:
+                        data["category_id"] = cat_map[data["category_id"]]
+                    rows.append(data)
+                dconn.execute(sa.insert(table), rows)
+                copied += len(rows)
+
+    db.session.execute(
+        sa.update(UserShard).where(UserShard.user_id == user_id).values(shard=target)
+    )
+    db.session.commit()
+
+    with src.begin() as sconn:
+        for table in reversed(tables + extra):
+            sconn.execute(sa.delete(table).where(table.c.user_id == user_id))
+    return copied
+
+
+def rebalance(max_moves=None):
+    """Move users from the fullest to the emptiest shard until counts even out.
+
+    Returns the list of (user_id, from_shard, to_shard) moves performed.
+    """
+    from .extensions import db
+    from .models import UserShard
+    router = get_router()
+    counts = dict.fromkeys(range(router.count), 0)
+    counts.update(db.session.execute(
+        sa.select(UserShard.shard, sa.func.count()).group_by(UserShard.shard)
+    ).all())
+    moves = []
+    while max_moves is None or len(moves) < max_moves:
+        hi = max(counts, key=counts.get)
+        lo = min(counts, key=counts.get)
+        if counts[hi] - counts[lo] <= 1:
+            break
+        user_id = db.session.execute(
+            sa.select(UserShard.user_id).where(UserShard.shard == hi).order_by(UserShard.user_id.desc()).limit(1)
+        ).scalar()
+        move_user(user_id, lo)
+        counts[hi] -= 1
+        counts[lo] += 1
+        moves.append((user_id, hi, lo))
+    return moves
+
+
+def init_app(app):
+    count = app.config.get("SHARD_COUNT") or 0
+    if count <= 0:
+        return
+    router = ShardRouter(app, count, app.config["SHARD_URL_TEMPLATE"])
+    app.extensions["shards"] = router
+    with app.app_context():
+        router.create_tables()
+
+    @app.before_request
+    def _bind_current_user_shard():
+        if current_user.is_authenticated:
+            bind_user(current_user.id)